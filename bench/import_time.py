@@ -0,0 +1,85 @@
+"""
+Checks that the bot starts fast: imports `src.main` in a fresh
+interpreter, with `python -X importtime`, and fails when it takes longer
+than the budget or pulls in a module that should only be imported on
+first use.
+
+    python -m bench.import_time
+    python -m bench.import_time --budget-ms 400 --top 15
+
+The exit code is 1 on a violation. Like the suite's baselines, the
+budget is machine specific.
+"""
+from __future__ import annotations
+from typing import Dict, List, Tuple
+import argparse
+import subprocess
+import sys
+
+# * only needed once a sale is posted, see src/collections/renderer.py
+# * and src/delivery.py
+DEFERRED_MODULES = ("discord", "aiohttp", "tweepy")
+
+
+def measure_imports(module: str) -> Dict[str, int]:
+    """
+    Cumulative import time of every module imported by `module`, in
+    microseconds.
+    """
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # * "import time: self [us] | cumulative | imported package"
+    times: Dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        name = name.strip()
+        times[name] = max(times.get(name, 0), int(cumulative))
+
+    return times
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=400)
+    parser.add_argument("--top", type=int, default=10, help="slowest to show")
+    args = parser.parse_args(args)
+
+    times = measure_imports("src.main")
+    total_ms = times["src.main"] / 1000
+
+    top_level: List[Tuple[str, int]] = sorted(
+        ((name, us) for name, us in times.items() if "." not in name),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    print(f"{'module':<32}{'ms':>10}")
+    for name, us in top_level[: args.top]:
+        print(f"{name:<32}{us / 1000:>10.1f}")
+
+    violations = []
+    if total_ms > args.budget_ms:
+        violations.append(
+            f"importing src.main took {total_ms:.0f}ms, over {args.budget_ms:.0f}ms"
+        )
+    for name in DEFERRED_MODULES:
+        if name in times:
+            violations.append(f"{name} is imported at start up")
+
+    print(f"src.main: {total_ms:.1f}ms, budget {args.budget_ms:.0f}ms")
+    if len(violations) > 0:
+        print(f"Violations: {'; '.join(violations)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Micro-benchmark of the preloaded kong boosts index against the previous
+implementation that parsed `meta/kongs.json` on every call.
+
+    python -m bench.kong_boosts [iterations]
+"""
+import json
+import random
+import sys
+import timeit
+
+import src.collections.kongs
+from src.collections.kongs import (
+    KONGS_JSON_PATH,
+    Boosts,
+    get_kong_boost_ranks,
+    get_kong_boosts,
+    load_kong_boosts_index,
+    load_kong_ranks_index,
+)
+
+
+def get_kong_boosts_from_json(kong_id: int) -> Boosts:
+    # * the implementation prior to the boosts index, kept for comparison
+    with open(KONGS_JSON_PATH, "r", encoding="utf-8") as f:
+        boosts = json.loads(f.read())[kong_id]["boosts"]
+    boosts["cumulative"] = (
+        boosts["shooting"] + boosts["vision"] + boosts["finish"] + boosts["defense"]
+    )
+    return boosts
+
+
+def main(iterations: int = 100) -> None:
+    kong_ids = [random.randrange(10_000) for _ in range(iterations)]
+
+    for kong_id in kong_ids[:10]:
+        assert get_kong_boosts(kong_id) == get_kong_boosts_from_json(kong_id)
+
+    # * drop the cached index so that the load from disk is measured
+    src.collections.kongs._boosts_index = None
+    load_time = timeit.timeit(load_kong_boosts_index, number=1)
+
+    json_time = timeit.timeit(
+        lambda: [get_kong_boosts_from_json(i) for i in kong_ids], number=1
+    )
+    index_time = timeit.timeit(lambda: [get_kong_boosts(i) for i in kong_ids], number=1)
+
+    src.collections.kongs._ranks_index = None
+    ranks_build_time = timeit.timeit(load_kong_ranks_index, number=1)
+    ranks_time = timeit.timeit(
+        lambda: [get_kong_boost_ranks(i) for i in kong_ids], number=1
+    )
+
+    print(f"index load (once per process): {load_time * 1e3:.3f} ms")
+    print(f"kongs.json per call: {json_time / iterations * 1e6:.1f} us/lookup")
+    print(f"boosts index:        {index_time / iterations * 1e6:.3f} us/lookup")
+    print(f"speedup: {json_time / index_time:.0f}x")
+    print(f"ranks build (once per process): {ranks_build_time * 1e3:.3f} ms")
+    print(f"ranks index:         {ranks_time / iterations * 1e6:.3f} us/lookup")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
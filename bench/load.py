@@ -0,0 +1,81 @@
+"""
+Runs the bot against the local stand-ins for a while and reports
+end-to-end throughput and sale to post latency, measured by the
+stand-in Discord webhook.
+
+    python -m bench.load --duration 60 --event-rate 5 --throttle-rate 0.05
+
+Takes the same fault and load options as `python -m bench.stand_in`.
+The bot's state goes to a temporary outbox, never to src/sales_since.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from bench.stand_in import from_args, parse_args
+
+
+def main(argv=None) -> None:
+    argv = list(sys.argv[1:] if argv is None else argv)
+
+    duration = 60.0
+    if "--duration" in argv:
+        i = argv.index("--duration")
+        duration = float(argv[i + 1])
+        del argv[i : i + 2]
+
+    args = parse_args(argv)
+    args.port = 0
+    if "--tweet-limit" not in argv:
+        # * tweets are on, a budget that the run uses up would leave the
+        # * delivery threads sleeping it out, and the run waiting on them
+        args.tweet_limit = 1_000_000
+    stand_in = from_args(args).start()
+
+    # * must be set before src is imported, consts are read at import
+    state_dir = tempfile.mkdtemp(prefix="salesbot_load_")
+    os.environ.update(stand_in.env())
+    os.environ["OUTBOX_PATH"] = os.path.join(state_dir, "outbox.db")
+    os.environ.setdefault("POLL_MIN_INTERVAL", "1")
+
+    from src.checkpoint import Checkpoint, get_checkpoint_store
+    from src.http_client import http_client
+    from src.main import run_collections
+    from src.sales_bot import SalesBotType
+
+    # * start from the moment the stand-in started, plus its backlog
+    since = int(stand_in.started_at) - int(args.backlog / max(args.event_rate, 1e-9))
+    for sales_bot_type in SalesBotType:
+        get_checkpoint_store().advance(
+            sales_bot_type.value, Checkpoint(None, None, since)
+        )
+    get_checkpoint_store().flush()
+
+    async def run_for(seconds: float):
+        started_at = time.time()
+        task = asyncio.create_task(run_collections(list(SalesBotType)))
+        await asyncio.sleep(seconds)
+
+        # * reported at the cancel: the delivery threads may still be
+        # * sleeping out a tweet budget, which the run waits on at exit
+        elapsed = time.time() - started_at
+        stats = stand_in.stats()
+        embeds = sum(w["embeds"] for w in stats["webhooks"].values())
+        stats["throughput_embeds_per_second"] = embeds / elapsed
+        stats["bot_http"] = http_client.stats()
+        print(json.dumps(stats, indent=2), flush=True)
+
+        task.cancel()
+
+    try:
+        asyncio.run(run_for(duration))
+    except asyncio.CancelledError:
+        pass
+    stand_in.stop()
+
+
+if __name__ == "__main__":
+    main()
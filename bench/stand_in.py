@@ -0,0 +1,683 @@
+"""
+Local stand-ins for the services the bot talks to, for offline load and
+fault testing:
+
+    * OpenSea   GET  /api/v2/events/collection/{slug}  (with `next` cursors)
+                GET  /api/v2/chain/ethereum/contract/{address}/nfts/{id}
+                GET  /api/v2/collection/{slug}/nfts     (with `next` cursors)
+    * Coinbase  GET  /v2/exchange-rates
+    * Discord   POST /api/webhooks/{id}/{token}         (with rate limit buckets)
+    * Twitter   POST /2/tweets                          (with a tweet budget)
+    * OpenSea   WS   /socket/websocket                  (Stream API, `--stream`)
+    * stats     GET  /stats
+
+Every collection slug gets a stream of sales generated at `event_rate`
+sales per second from the moment the server starts. Point the bot at it
+with OPENSEA_API_URL, COINBASE_API_URL, TWITTER_API_URL, TWEEPY_* and
+DISCORD_*_WEBHOOK, see `StandIn.env`. With `--stream`, the sales are
+pushed over the websocket too, as `item_sold` events of the Phoenix
+channel `collection:{slug}`, and the bot is told to subscribe to them.
+
+    python -m bench.stand_in --port 8080 --event-rate 2 --latency 0.05
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import math
+import threading
+import hashlib
+import base64
+import select
+import struct
+import random
+import json
+import time
+
+SLUG_ASSET_NAMES = {
+    "rumble-kong-league": "Kong #{}",
+    "rumble-kong-league-sneakers": "RKL Sneakers #{}",
+    "rkl-rookies": "Rookie #{}",
+}
+STAND_IN_CONTRACT = "0x" + "c" * 40
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # in seconds, added to every response
+    throttle_rate: float = 0.0  # share of requests answered with a 429
+    error_rate: float = 0.0  # share of requests answered with a 503
+    retry_after: float = 1.0  # in seconds, sent with injected 429s
+
+
+@dataclass
+class WebhookBucket:
+    limit: int
+    window: float  # in seconds
+    remaining: int = 0
+    reset_at: float = 0.0
+    posts: List[Dict] = field(default_factory=list)
+    throttled: int = 0
+
+
+class SaleGenerator:
+    """
+    Deterministic stream of sales for one collection: sale `i` closes at
+    `started_at + i / rate`. Served newest first, like OpenSea does.
+    """
+
+    def __init__(
+        self,
+        slug: str,
+        rate: float,
+        started_at: float,
+        backlog: int,
+        missing_image_rate: float = 0.0,
+    ):
+        self.slug = slug
+        self.rate = rate
+        # * share of sales that come without an image url
+        self.missing_image_rate = missing_image_rate
+        # * sales that closed before the server started, to test catch ups
+        self.started_at = started_at - backlog / rate if rate > 0 else started_at
+
+    def count(self, now: float) -> int:
+        if self.rate <= 0:
+            return 0
+        return int((now - self.started_at) * self.rate)
+
+    def closing_date(self, i: int) -> int:
+        return int(self.started_at + i / self.rate)
+
+    def event(self, i: int) -> Dict:
+        name = SLUG_ASSET_NAMES.get(self.slug, self.slug + " #{}")
+        token_id = i % 10_000
+        return {
+            "event_type": "sale",
+            "order_hash": f"0x{i:064x}",
+            "chain": "ethereum",
+            "closing_date": self.closing_date(i),
+            "transaction": f"0x{hash((self.slug, i)) & (2**256 - 1):064x}",
+            "nft": {
+                "identifier": str(token_id),
+                "name": name.format(token_id),
+                "image_url": (
+                    None
+                    if random.Random(i).random() < self.missing_image_rate
+                    else f"https://example.com/{self.slug}/{token_id}.png"
+                ),
+            },
+            "payment": {
+                "quantity": str(random.randint(1, 50) * 10**17),
+                "symbol": "ETH",
+                "decimals": 18,
+            },
+            "buyer": "0x" + "b" * 40,
+            "seller": "0x" + "5" * 40,
+        }
+
+    def stream_event(self, i: int) -> Dict:
+        # * the same sale, as the Stream API pushes it
+        event = self.event(i)
+        nft = event["nft"]
+        closed_at = datetime.fromtimestamp(
+            event["closing_date"], timezone.utc
+        ).isoformat()
+        return {
+            "event_type": "item_sold",
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+            "payload": {
+                "closing_date": closed_at,
+                "event_timestamp": closed_at,
+                "collection": {"slug": self.slug},
+                "item": {
+                    "nft_id": f"ethereum/{STAND_IN_CONTRACT}/{nft['identifier']}",
+                    "chain": {"name": "ethereum"},
+                    "metadata": {"name": nft["name"], "image_url": nft["image_url"]},
+                },
+                "maker": {"address": event["seller"]},
+                "taker": {"address": event["buyer"]},
+                "payment_token": {
+                    "address": "0x" + "0" * 40,
+                    "symbol": event["payment"]["symbol"],
+                    "decimals": event["payment"]["decimals"],
+                },
+                "quantity": 1,
+                "sale_price": event["payment"]["quantity"],
+                "transaction": {"hash": event["transaction"], "timestamp": closed_at},
+                "order_hash": event["order_hash"],
+                "is_private": False,
+            },
+        }
+
+    def page(
+        self, after: int, cursor: Optional[str], limit: int, before: Optional[int]
+    ) -> Dict:
+        # * the cursor is the index of the newest sale of the page
+        newest = self.count(time.time()) - 1 if cursor is None else int(cursor)
+        if cursor is None and before is not None and self.rate > 0:
+            newest = min(newest, math.ceil((before - self.started_at) * self.rate))
+            while newest >= 0 and self.closing_date(newest) >= before:
+                newest -= 1
+
+        events = []
+        i = newest
+        while i >= 0 and len(events) < limit and self.closing_date(i) > after:
+            events.append(self.event(i))
+            i -= 1
+
+        has_more = i >= 0 and self.closing_date(i) > after
+        return {"asset_events": events, "next": str(i) if has_more else None}
+
+
+def latency_stats(latencies: List[float]) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "p50": latencies[len(latencies) // 2] if latencies else None,
+        "p99": latencies[int(len(latencies) * 0.99)] if latencies else None,
+        "max": latencies[-1] if latencies else None,
+    }
+
+
+class StandIn:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        event_rate: float = 1.0,
+        backlog: int = 0,
+        faults: Optional[Faults] = None,
+        webhook_limit: int = 5,
+        webhook_window: float = 2.0,
+        tweet_limit: int = 50,
+        tweet_window: float = 60.0,
+        missing_image_rate: float = 0.0,
+        stream: bool = False,
+        stream_drop_interval: float = 0.0,
+    ):
+        self.event_rate = event_rate
+        self.backlog = backlog
+        self.missing_image_rate = missing_image_rate
+        self.faults = faults or Faults()
+        self.webhook_limit = webhook_limit
+        self.webhook_window = webhook_window
+        self.tweets = WebhookBucket(tweet_limit, tweet_window)
+        self.tweet_texts: set = set()
+        self.duplicate_tweets = 0
+        self.stream = stream
+        # * in seconds, stream connections are dropped after this long
+        self.stream_drop_interval = stream_drop_interval
+        self.stream_connections = 0
+        self.stream_pushed = 0
+
+        self.started_at = time.time()
+        self.generators: Dict[str, SaleGenerator] = {}
+        self.buckets: Dict[str, WebhookBucket] = {}
+        self.requests_count: Dict[str, int] = {}
+        # * closing date of every sale served, to measure sale to post latency.
+        # * Embeds are matched by title, "{asset name} Sold"
+        self.closing_dates: Dict[str, int] = {}
+        self.latencies: List[float] = []
+        self.tweet_latencies: List[float] = []
+        self._lock = threading.Lock()
+
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        return {
+            "OPENSEA_API_URL": self.url,
+            "COINBASE_API_URL": self.url,
+            "DISCORD_KONG_WEBHOOK": f"{self.url}/api/webhooks/0/kongs",
+            "DISCORD_SNEAKER_WEBHOOK": f"{self.url}/api/webhooks/1/sneakers",
+            "DISCORD_ROOKIE_WEBHOOK": f"{self.url}/api/webhooks/2/rookies",
+            "TWITTER_API_URL": self.url,
+            "TWEEPY_API_KEY": "stand-in",
+            "TWEEPY_API_SECRET": "stand-in",
+            "TWEEPY_ACCESS_TOKEN": "stand-in",
+            "TWEEPY_ACCESS_TOKEN_SECRET": "stand-in",
+            "OPENSEA_STREAM": "1" if self.stream else "0",
+            "OPENSEA_STREAM_URL": self.url.replace("http", "ws", 1)
+            + "/socket/websocket",
+        }
+
+    def start(self) -> "StandIn":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+
+    def generator(self, slug: str) -> SaleGenerator:
+        with self._lock:
+            if slug not in self.generators:
+                self.generators[slug] = SaleGenerator(
+                    slug,
+                    self.event_rate,
+                    self.started_at,
+                    self.backlog,
+                    self.missing_image_rate,
+                )
+            return self.generators[slug]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "uptime": time.time() - self.started_at,
+                "requests": dict(self.requests_count),
+                "sales_generated": {
+                    slug: g.count(time.time()) for slug, g in self.generators.items()
+                },
+                "webhooks": {
+                    path: {
+                        "posts": len(b.posts),
+                        "embeds": sum(len(p.get("embeds", [])) for p in b.posts),
+                        "throttled": b.throttled,
+                    }
+                    for path, b in self.buckets.items()
+                },
+                "tweets": {
+                    "posts": len(self.tweets.posts),
+                    "throttled": self.tweets.throttled,
+                    "duplicates": self.duplicate_tweets,
+                },
+                "stream": {
+                    "connections": self.stream_connections,
+                    "pushed": self.stream_pushed,
+                },
+                "sale_to_post_latency": latency_stats(self.latencies),
+                "sale_to_tweet_latency": latency_stats(self.tweet_latencies),
+            }
+
+    def _record_post(self, body: Dict) -> None:
+        now = time.time()
+        with self._lock:
+            for embed in body.get("embeds", []):
+                name = embed.get("title", "").rsplit(" Sold", 1)[0]
+                closing_date = self.closing_dates.get(name)
+                if closing_date is not None:
+                    self.latencies.append(now - closing_date)
+
+    def _take(self, bucket: WebhookBucket) -> bool:
+        # * True if the bucket has a request left in its window
+        now = time.time()
+        if now >= bucket.reset_at:
+            bucket.remaining = bucket.limit
+            bucket.reset_at = now + bucket.window
+
+        if bucket.remaining == 0:
+            bucket.throttled += 1
+            return False
+        bucket.remaining -= 1
+        return True
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status: int, body: Optional[Dict], headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, str(value))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def inject_faults(self) -> bool:
+                faults = stand_in.faults
+                if faults.latency > 0:
+                    time.sleep(faults.latency)
+
+                roll = random.random()
+                if roll < faults.throttle_rate:
+                    self.reply(
+                        429,
+                        {"retry_after": faults.retry_after, "global": False},
+                        {"Retry-After": faults.retry_after},
+                    )
+                    return True
+                if roll < faults.throttle_rate + faults.error_rate:
+                    self.reply(503, {"error": "injected"})
+                    return True
+                return False
+
+            def count(self, kind: str) -> None:
+                with stand_in._lock:
+                    stand_in.requests_count[kind] = (
+                        stand_in.requests_count.get(kind, 0) + 1
+                    )
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+
+                if url.path == "/stats":
+                    return self.reply(200, stand_in.stats())
+
+                if url.path == "/socket/websocket":
+                    self.count("opensea_stream")
+                    return self.stream()
+
+                if url.path.startswith("/api/v2/events/collection/"):
+                    self.count("opensea_events")
+                    if self.inject_faults():
+                        return
+                    slug = url.path.rsplit("/", 1)[-1]
+                    page = stand_in.generator(slug).page(
+                        int(query.get("after", ["0"])[0]),
+                        query.get("next", [None])[0],
+                        int(query.get("limit", ["50"])[0]),
+                        int(query["before"][0]) if "before" in query else None,
+                    )
+                    # * remember when each served sale closed, by asset name
+                    with stand_in._lock:
+                        for event in page["asset_events"]:
+                            stand_in.closing_dates[event["nft"]["name"]] = event[
+                                "closing_date"
+                            ]
+                    return self.reply(200, page)
+
+                if url.path.startswith("/api/v2/chain/ethereum/contract/"):
+                    self.count("opensea_nft")
+                    if self.inject_faults():
+                        return
+                    token_id = url.path.rsplit("/", 1)[-1]
+                    return self.reply(
+                        200,
+                        {"nft": {"image_url": f"https://example.com/{token_id}.png"}},
+                    )
+
+                if url.path.startswith("/api/v2/collection/"):
+                    self.count("opensea_collection_nfts")
+                    if self.inject_faults():
+                        return
+                    slug = url.path.split("/")[4]
+                    # * the cursor is the token id the page starts at
+                    start = int(query.get("next", ["0"])[0])
+                    end = min(start + int(query.get("limit", ["50"])[0]), 10_000)
+                    return self.reply(
+                        200,
+                        {
+                            "nfts": [
+                                {
+                                    "identifier": str(token_id),
+                                    "image_url": f"https://example.com/{slug}/{token_id}.png",
+                                }
+                                for token_id in range(start, end)
+                            ],
+                            "next": str(end) if end < 10_000 else None,
+                        },
+                    )
+
+                if url.path == "/v2/exchange-rates":
+                    self.count("coinbase")
+                    if self.inject_faults():
+                        return
+                    return self.reply(
+                        200,
+                        {
+                            "data": {
+                                "currency": "USD",
+                                "rates": {"ETH": "0.0005", "USDC": "1.0"},
+                            }
+                        },
+                    )
+
+                self.reply(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                body = json.loads(
+                    self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}"
+                )
+
+                if url.path == "/2/tweets":
+                    return self.tweet(body)
+
+                if not url.path.startswith("/api/webhooks/"):
+                    return self.reply(404, {"error": "not found"})
+
+                self.count("discord")
+                if self.inject_faults():
+                    return
+
+                with stand_in._lock:
+                    bucket = stand_in.buckets.setdefault(
+                        url.path,
+                        WebhookBucket(stand_in.webhook_limit, stand_in.webhook_window),
+                    )
+                    throttled = not stand_in._take(bucket)
+                    if not throttled:
+                        bucket.posts.append(body)
+                    reset_after = round(bucket.reset_at - time.time(), 3)
+                    remaining = bucket.remaining
+
+                headers = {
+                    "X-RateLimit-Limit": stand_in.webhook_limit,
+                    "X-RateLimit-Remaining": remaining,
+                    "X-RateLimit-Reset-After": reset_after,
+                    "X-RateLimit-Bucket": url.path,
+                }
+                if throttled:
+                    headers["Retry-After"] = reset_after
+                    return self.reply(
+                        429, {"retry_after": reset_after, "global": False}, headers
+                    )
+
+                stand_in._record_post(body)
+                self.reply(204, None, headers)
+
+            def stream(self):
+                # * just enough of RFC 6455 and the Phoenix protocol
+                key = self.headers.get("Sec-WebSocket-Key", "")
+                accept = base64.b64encode(
+                    hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()
+                ).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.close_connection = True
+
+                with stand_in._lock:
+                    stand_in.stream_connections += 1
+                # * slug -> index of the next sale to push
+                subscriptions: Dict[str, int] = {}
+                connected_at = time.time()
+                drop_interval = stand_in.stream_drop_interval
+
+                while drop_interval <= 0 or time.time() - connected_at < drop_interval:
+                    readable, _, _ = select.select([self.connection], [], [], 0.05)
+                    if readable:
+                        message = self.read_frame()
+                        if message is None:
+                            return
+                        if message:
+                            self.on_stream_message(json.loads(message), subscriptions)
+
+                    now = time.time()
+                    for slug, i in subscriptions.items():
+                        generator = stand_in.generator(slug)
+                        count = generator.count(now)
+                        for j in range(i, count):
+                            self.push_sale(generator, j)
+                        subscriptions[slug] = max(i, count)
+
+                self.send_frame(b"", opcode=0x8)
+
+            def on_stream_message(self, message: Dict, subscriptions: Dict[str, int]):
+                reply = {
+                    "topic": message["topic"],
+                    "event": "phx_reply",
+                    "payload": {"status": "ok", "response": {}},
+                    "ref": message.get("ref"),
+                }
+                if message["event"] == "phx_join":
+                    slug = message["topic"].split(":", 1)[1]
+                    # * only the sales from now on, the rest is polled
+                    subscriptions[slug] = stand_in.generator(slug).count(time.time())
+                self.send_frame(json.dumps(reply).encode())
+
+            def push_sale(self, generator: SaleGenerator, i: int):
+                payload = generator.stream_event(i)
+                name = payload["payload"]["item"]["metadata"]["name"]
+                with stand_in._lock:
+                    stand_in.closing_dates[name] = generator.closing_date(i)
+                    stand_in.stream_pushed += 1
+                message = {
+                    "topic": f"collection:{generator.slug}",
+                    "event": "item_sold",
+                    "payload": payload,
+                    "ref": None,
+                }
+                self.send_frame(json.dumps(message).encode())
+
+            def read_frame(self) -> Optional[bytes]:
+                # * None once the client closes, b"" for control frames
+                header = self.rfile.read(2)
+                if len(header) < 2:
+                    return None
+                opcode = header[0] & 0x0F
+                length = header[1] & 0x7F
+                if length == 126:
+                    (length,) = struct.unpack("!H", self.rfile.read(2))
+                elif length == 127:
+                    (length,) = struct.unpack("!Q", self.rfile.read(8))
+                mask = self.rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+                data = bytes(
+                    byte ^ mask[i % 4] for i, byte in enumerate(self.rfile.read(length))
+                )
+
+                if opcode == 0x8:
+                    return None
+                if opcode == 0x9:
+                    self.send_frame(data, opcode=0xA)
+                    return b""
+                return data if opcode == 0x1 else b""
+
+            def send_frame(self, data: bytes, opcode: int = 0x1):
+                if len(data) < 126:
+                    header = struct.pack("!BB", 0x80 | opcode, len(data))
+                elif len(data) < 2**16:
+                    header = struct.pack("!BBH", 0x80 | opcode, 126, len(data))
+                else:
+                    header = struct.pack("!BBQ", 0x80 | opcode, 127, len(data))
+                self.wfile.write(header + data)
+                self.wfile.flush()
+
+            def tweet(self, body: Dict):
+                self.count("twitter")
+                if not self.headers.get("Authorization", "").startswith("OAuth "):
+                    return self.reply(401, {"title": "Unauthorized"})
+                if self.inject_faults():
+                    return
+
+                text = body.get("text", "")
+                with stand_in._lock:
+                    bucket = stand_in.tweets
+                    if text in stand_in.tweet_texts:
+                        stand_in.duplicate_tweets += 1
+                        status = 403
+                    elif stand_in._take(bucket):
+                        stand_in.tweet_texts.add(text)
+                        bucket.posts.append(body)
+                        status = 201
+                    else:
+                        status = 429
+                    remaining = bucket.remaining
+                    reset_at = int(bucket.reset_at) + 1
+
+                headers = {
+                    "x-rate-limit-limit": bucket.limit,
+                    "x-rate-limit-remaining": remaining,
+                    "x-rate-limit-reset": reset_at,
+                }
+                if status == 403:
+                    return self.reply(
+                        403,
+                        {
+                            "detail": "You are not allowed to create a Tweet "
+                            + "with duplicate content.",
+                            "status": 403,
+                        },
+                        headers,
+                    )
+                if status == 429:
+                    return self.reply(429, {"title": "Too Many Requests"}, headers)
+
+                # * tweets of single sales start with the asset name
+                name = text.split(" bought for ", 1)[0]
+                with stand_in._lock:
+                    closing_date = stand_in.closing_dates.get(name)
+                    if closing_date is not None:
+                        stand_in.tweet_latencies.append(time.time() - closing_date)
+                self.reply(
+                    201, {"data": {"id": str(len(bucket.posts)), "text": text}}, headers
+                )
+
+        return Handler
+
+
+def parse_args(args=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--event-rate", type=float, default=1.0, help="sales/s")
+    parser.add_argument("--backlog", type=int, default=0, help="sales before start")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--webhook-limit", type=int, default=5)
+    parser.add_argument("--webhook-window", type=float, default=2.0)
+    parser.add_argument("--tweet-limit", type=int, default=50)
+    parser.add_argument("--tweet-window", type=float, default=60.0)
+    parser.add_argument("--missing-image-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="push over ws")
+    parser.add_argument("--stream-drop-interval", type=float, default=0.0)
+    return parser.parse_args(args)
+
+
+def from_args(args: argparse.Namespace) -> StandIn:
+    return StandIn(
+        args.host,
+        args.port,
+        args.event_rate,
+        args.backlog,
+        Faults(args.latency, args.throttle_rate, args.error_rate),
+        args.webhook_limit,
+        args.webhook_window,
+        args.tweet_limit,
+        args.tweet_window,
+        args.missing_image_rate,
+        args.stream,
+        args.stream_drop_interval,
+    )
+
+
+if __name__ == "__main__":
+    stand_in = from_args(parse_args()).start()
+    for name, value in stand_in.env().items():
+        print(f"{name}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stand_in.stop()
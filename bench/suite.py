@@ -0,0 +1,181 @@
+"""
+Benchmarks of the parse -> enrich -> render hot path, on the OpenSea
+event fixtures in bench/fixtures: single sales of every collection and
+20 item bundles.
+
+    python -m bench.suite           # run and compare against the baselines
+    python -m bench.suite --save    # run and store the results as baselines
+
+For every (case, stage) it reports ops/sec and the peak memory allocated
+by one op, as seen by tracemalloc. A stage whose ops/sec drops more than
+`--tolerance` below its baseline is a regression, and the exit code is 1.
+Baselines are machine specific, regenerate them when switching machines.
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional
+from pathlib import Path
+import argparse
+import tracemalloc
+import json
+import math
+import sys
+import time
+
+import src.util
+from src.collections.kongs import get_kong_boosts, load_kong_boosts_index
+from src.opensea import SalesDatum, TradeSide, get_trade_counter_party
+from src.price_oracle import PriceOracle
+from src.sales_bot import SalesBot, SalesBotType
+
+FIXTURES_PATH = Path(__file__).parent / "fixtures"
+BASELINES_PATH = Path(__file__).parent / "baselines.json"
+ROUNDS = 5
+
+CASES = {
+    "kong_sale": SalesBotType.KONG,
+    "sneaker_sale": SalesBotType.SNEAKER,
+    "rookie_sale": SalesBotType.ROOKIE,
+    "kong_bundle": SalesBotType.KONG,
+    "sneaker_bundle": SalesBotType.SNEAKER,
+}
+
+
+def load_fixture(name: str) -> Dict:
+    with open(FIXTURES_PATH / f"{name}.json", "r", encoding="utf-8") as f:
+        return json.loads(f.read())
+
+
+def measure(op: Callable[[], object], min_time: float) -> Dict[str, float]:
+    op()  # warm up caches, e.g. the boosts index
+
+    # * best of a few rounds, so that noise from other processes on the
+    # * machine does not read as a regression
+    best_ops_per_sec = 0.0
+    for _ in range(ROUNDS):
+        ops = 0
+        started_at = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time / ROUNDS:
+            op()
+            ops += 1
+            elapsed = time.perf_counter() - started_at
+        best_ops_per_sec = max(best_ops_per_sec, ops / elapsed)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    op()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"ops_per_sec": best_ops_per_sec, "peak_kib_per_op": (peak - before) / 1024}
+
+
+def build_stages(case: str, sales_bot_type: SalesBotType) -> Dict[str, Callable]:
+    event = load_fixture(case)
+    sales_bot = SalesBot(sales_bot_type)
+    data = SalesDatum.from_json(event, sales_bot.spec)
+
+    stages: Dict[str, Callable] = {
+        "parse": lambda: SalesDatum.from_json(event, sales_bot.spec),
+        "render_discord": lambda: sales_bot.build_discord_messages(data),
+        "render_twitter": lambda: sales_bot.build_twitter_message(data),
+    }
+
+    if sales_bot_type == SalesBotType.KONG:
+        token_ids = [datum.token_id for datum in data]
+        stages["enrich_boosts"] = lambda: [get_kong_boosts(i) for i in token_ids]
+
+    if "asset_bundle" in event:
+        stages["enrich_counter_party"] = lambda: (
+            get_trade_counter_party(TradeSide.Buyer, event),
+            get_trade_counter_party(TradeSide.Seller, event),
+        )
+
+    return stages
+
+
+def run(min_time: float) -> Dict[str, Dict[str, Dict[str, float]]]:
+    # * prices come from the recorded exchange rates, never the network
+    rates = {
+        symbol: float(rate)
+        for symbol, rate in load_fixture("exchange_rates")["data"]["rates"].items()
+    }
+    src.util.price_oracle = PriceOracle(ttl=math.inf, fetch=lambda: rates)
+
+    try:
+        load_kong_boosts_index()
+        has_boosts = True
+    except OSError:
+        print("meta/kongs.json is missing, skipping the kong cases", file=sys.stderr)
+        has_boosts = False
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for case, sales_bot_type in CASES.items():
+        if sales_bot_type == SalesBotType.KONG and not has_boosts:
+            continue
+        results[case] = {
+            stage: measure(op, min_time)
+            for stage, op in build_stages(case, sales_bot_type).items()
+        }
+
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Dict[str, float]]],
+    baselines: Dict[str, Dict[str, Dict[str, float]]],
+    tolerance: float,
+) -> List[str]:
+    print(f"{'case':<16}{'stage':<22}{'ops/sec':>12}{'baseline':>12}{'KiB/op':>10}")
+
+    regressions = []
+    for case, stages in results.items():
+        for stage, result in stages.items():
+            baseline: Optional[Dict[str, float]] = baselines.get(case, {}).get(stage)
+            baseline_text = "-"
+            flag = ""
+            if baseline is not None:
+                baseline_text = f"{baseline['ops_per_sec']:.0f}"
+                if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance):
+                    flag = "  REGRESSION"
+                    regressions.append(f"{case}/{stage}")
+            print(
+                f"{case:<16}{stage:<22}{result['ops_per_sec']:>12.0f}"
+                + f"{baseline_text:>12}{result['peak_kib_per_op']:>10.1f}{flag}"
+            )
+
+    return regressions
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save", action="store_true", help="store as baselines")
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    parser.add_argument("--min-time", type=float, default=0.5, help="per stage, s")
+    args = parser.parse_args(args)
+
+    results = run(args.min_time)
+
+    baselines = {}
+    if BASELINES_PATH.exists():
+        with open(BASELINES_PATH, "r", encoding="utf-8") as f:
+            baselines = json.loads(f.read())
+
+    regressions = compare(results, baselines, args.tolerance)
+
+    if args.save:
+        with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baselines to {BASELINES_PATH}")
+        return 0
+
+    if len(regressions) > 0:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+Rebuilds the sales history of a collection into a SQLite archive,
+without posting anything:
+
+    python -m src.backfill 0 --from 2022-01-01 --to 2022-07-01
+
+The range is split into time slices, each walked by its own `next`
+cursor, a few slices at once. The pages are parsed and enriched in a
+process pool. Every page's rows are written in the same transaction as
+its slice's cursor, so running the same command again resumes where an
+interrupted backfill stopped. Without `--to`, it resumes up to the end,
+and with the slices, of the unfinished backfill from the same start.
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import multiprocessing
+import threading
+import argparse
+import logging
+import sqlite3
+import math
+import time
+import sys
+
+from src.collections.renderer import CollectionSpec
+import src.util
+from src.consts import (
+    ARCHIVE_PATH,
+    BACKFILL_SLICES,
+    BACKFILL_FETCHERS,
+    OPENSEA_EVENTS_PAGE_SIZE,
+)
+from src.opensea import (
+    SalesDatum,
+    fetch_sale_events_page,
+    get_event_block_and_index,
+    get_event_key,
+)
+from src.sales_bot import SalesBot, SalesBotType
+
+# * one row per asset sold, a bundle has several. In the order of the
+# * columns of the sales table, after the collection
+ArchiveRow = Tuple[
+    str,  # event key
+    str,  # token id
+    Optional[str],  # asset name
+    Optional[int],  # timestamp
+    Optional[int],  # block
+    Optional[int],  # transaction index
+    str,  # buyer
+    str,  # buyer address
+    str,  # seller
+    str,  # seller address
+    str,  # payment symbol
+    float,  # price of the whole sale, in the payment token
+    Optional[int],  # cumulative boosts, kongs only
+]
+
+
+@dataclass(frozen=True)
+class Slice:
+    after: int
+    before: int
+
+
+def split_range(after: int, before: int, slices: int) -> List[Slice]:
+    """
+    >>> split_range(0, 10, 3)
+    [Slice(after=0, before=4), Slice(after=3, before=8), Slice(after=7, before=10)]
+    """
+
+    step = max(1, math.ceil((before - after) / slices))
+    # * both bounds are exclusive, so each slice starts a second before
+    # * the previous one ends, the archive ignores the sales seen twice
+    return [
+        Slice(start - 1 if start > after else start, min(start + step, before))
+        for start in range(after, before, step)
+    ]
+
+
+class SalesArchive:
+    """
+    Past sales in SQLite, one row per asset sold, indexed by block, token
+    id, buyer and seller. Each backfill slice's page cursor is kept next
+    to them, and moves in the same transaction as the page's rows.
+
+    Each backfill's range is kept too, until it is done, so that one
+    resumed without an end picks the same slices again.
+
+    Events of the v2 API only carry a transaction hash, so their block
+    is NULL, the timestamp index covers them instead.
+    """
+
+    def __init__(self, path: str = ARCHIVE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sales (
+                    collection INTEGER NOT NULL,
+                    event_key TEXT NOT NULL,
+                    token_id TEXT NOT NULL,
+                    asset_name TEXT,
+                    timestamp INTEGER,
+                    block INTEGER,
+                    tx_index INTEGER,
+                    buyer TEXT,
+                    buyer_address TEXT,
+                    seller TEXT,
+                    seller_address TEXT,
+                    payment_symbol TEXT,
+                    price REAL,
+                    boosts INTEGER,
+                    PRIMARY KEY (collection, event_key, token_id)
+                ) WITHOUT ROWID
+                """
+            )
+            for name, columns in (
+                ("block", "collection, block, tx_index"),
+                ("token", "collection, token_id"),
+                ("timestamp", "collection, timestamp"),
+                ("buyer", "buyer_address"),
+                ("seller", "seller_address"),
+            ):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS sales_{name} ON sales ({columns})"
+                )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS backfill_cursors (
+                    collection INTEGER NOT NULL,
+                    after INTEGER NOT NULL,
+                    before INTEGER NOT NULL,
+                    cursor TEXT,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (collection, after, before)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS backfill_runs (
+                    collection INTEGER NOT NULL,
+                    after INTEGER NOT NULL,
+                    before INTEGER NOT NULL,
+                    slices INTEGER NOT NULL,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (collection, after)
+                )
+                """
+            )
+
+    def unfinished_run(self, collection: int, after: int) -> Optional[Tuple[int, int]]:
+        """
+        The end and number of slices of the unfinished backfill from
+        `after`, None if there is none.
+        """
+
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT before, slices FROM backfill_runs
+                WHERE collection = ? AND after = ? AND done = 0
+                """,
+                (collection, after),
+            ).fetchone()
+
+    def start_run(self, collection: int, after: int, before: int, slices: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO backfill_runs
+                (collection, after, before, slices, done) VALUES (?, ?, ?, ?, 0)
+                """,
+                (collection, after, before, slices),
+            )
+
+    def finish_run(self, collection: int, after: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE backfill_runs SET done = 1 WHERE collection = ? AND after = ?",
+                (collection, after),
+            )
+
+    def cursor(self, collection: int, time_slice: Slice) -> Tuple[Optional[str], bool]:
+        """
+        The cursor of the slice's next page, None if it was never
+        started, and whether it is done.
+        """
+
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT cursor, done FROM backfill_cursors
+                WHERE collection = ? AND after = ? AND before = ?
+                """,
+                (collection, time_slice.after, time_slice.before),
+            ).fetchone()
+        if row is None:
+            return None, False
+        return row[0], bool(row[1])
+
+    def write_page(
+        self,
+        collection: int,
+        time_slice: Slice,
+        rows: List[ArchiveRow],
+        cursor: Optional[str],
+    ) -> int:
+        """
+        Stores a page's rows, and the cursor of the page after it, None
+        once the slice is done. Returns the number of new rows.
+        """
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO sales VALUES
+                (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(collection, *row) for row in rows],
+            )
+            new_rows = self._conn.total_changes - before
+
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO backfill_cursors
+                (collection, after, before, cursor, done) VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    collection,
+                    time_slice.after,
+                    time_slice.before,
+                    cursor,
+                    int(cursor is None),
+                ),
+            )
+            return new_rows
+
+    def count(self, collection: int) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sales WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+
+
+def parse_page(events: List[Dict], spec: CollectionSpec) -> List[ArchiveRow]:
+    rows: List[ArchiveRow] = []
+    for event in events:
+        # * the archive keeps the price in the payment token, so the
+        # * sales need no exchange rates. An event that still does not
+        # * parse is skipped, rather than failing its slice on every run
+        try:
+            event_key = get_event_key(event)
+            block, tx_index = get_event_block_and_index(event)
+            data = SalesDatum.from_json(event, spec, with_usd_price=False)
+        except Exception as e:
+            logging.warning(f"{spec.name}: skipped an event that does not parse: {e!r}")
+            continue
+
+        for datum in data:
+            rows.append(
+                (
+                    event_key,
+                    str(datum.token_id),
+                    datum.asset_name,
+                    datum.event_timestamp,
+                    block,
+                    tx_index,
+                    datum.buyer,
+                    datum.buyer_address,
+                    datum.seller,
+                    datum.seller_address,
+                    datum.payment_symbol,
+                    datum.price_eth(),
+                    None if datum.boosts is None else datum.boosts["cumulative"],
+                )
+            )
+    return rows
+
+
+def backfill_slice(
+    archive: SalesArchive,
+    parsers: Executor,
+    sales_bot_type: SalesBotType,
+    time_slice: Slice,
+) -> int:
+    """
+    Archives the sales of one slice, from its stored cursor on. Returns
+    the number of new rows.
+    """
+
+    collection = sales_bot_type.value
+    cursor, done = archive.cursor(collection, time_slice)
+    if done:
+        return 0
+
+    sales_bot = SalesBot(sales_bot_type)
+    params: Dict = {
+        "after": time_slice.after,
+        "before": time_slice.before,
+        "limit": OPENSEA_EVENTS_PAGE_SIZE,
+    }
+
+    new_rows = 0
+    while True:
+        if cursor is not None:
+            params["next"] = cursor
+        page = fetch_sale_events_page(sales_bot.opensea_slug, params)
+
+        events = page.get("asset_events", [])
+        rows = (
+            parsers.submit(parse_page, events, sales_bot.spec).result()
+            if len(events) > 0
+            else []
+        )
+
+        # * an empty page without a cursor ends the slice too
+        cursor = page.get("next") or None
+        new_rows += archive.write_page(collection, time_slice, rows, cursor)
+        if cursor is None:
+            return new_rows
+
+
+def backfill(
+    sales_bot_type: SalesBotType,
+    after: int,
+    before: int,
+    slices: int = BACKFILL_SLICES,
+    fetchers: int = BACKFILL_FETCHERS,
+    workers: Optional[int] = None,
+    archive: Optional[SalesArchive] = None,
+) -> Tuple[int, int]:
+    """
+    Archives the collection's sales between `after` and `before`, unix
+    timestamps. Returns the number of new rows, and of slices that
+    failed, to be retried by running it again.
+    """
+
+    archive = archive or SalesArchive()
+    time_slices = split_range(after, before, slices)
+    archive.start_run(sales_bot_type.value, after, before, slices)
+
+    new_rows = 0
+    failed = 0
+    # * spawned rather than forked, the fetcher threads may hold locks
+    with ProcessPoolExecutor(
+        workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as parsers, ThreadPoolExecutor(fetchers) as fetch_pool:
+        futures = {
+            fetch_pool.submit(
+                backfill_slice, archive, parsers, sales_bot_type, time_slice
+            ): time_slice
+            for time_slice in time_slices
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            time_slice = futures[future]
+            try:
+                slice_rows = future.result()
+            except Exception:
+                src.util.handle_exception()
+                failed += 1
+                print(f"{sales_bot_type.name}: slice {time_slice} failed")
+                continue
+
+            new_rows += slice_rows
+            print(
+                f"{sales_bot_type.name}: {i}/{len(time_slices)} slices done, "
+                + f"{slice_rows} new sales in {time_slice}"
+            )
+
+    if failed == 0:
+        archive.finish_run(sales_bot_type.value, after)
+    return new_rows, failed
+
+
+def parse_timestamp(value: str) -> int:
+    # * unix timestamp, or an iso date in utc
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "collection",
+        type=int,
+        help=", ".join(f"{t.value} {t.name.lower()}s" for t in SalesBotType),
+    )
+    parser.add_argument("--from", dest="after", type=parse_timestamp, required=True)
+    parser.add_argument("--to", dest="before", type=parse_timestamp)
+    parser.add_argument(
+        "--slices",
+        type=int,
+        help=f"{BACKFILL_SLICES} by default, a resumed backfill keeps its own",
+    )
+    parser.add_argument("--fetchers", type=int, default=BACKFILL_FETCHERS)
+    parser.add_argument("--workers", type=int, help="parsing processes")
+    parser.add_argument("--archive", default=ARCHIVE_PATH)
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    sales_bot_type = SalesBotType.from_int(args.collection)
+    archive = SalesArchive(args.archive)
+
+    before, slices = args.before, args.slices
+    if before is None:
+        # * "now" moves, so an interrupted backfill is resumed with the
+        # * end, and the slices, that its cursors were stored with
+        run = archive.unfinished_run(sales_bot_type.value, args.after)
+        if run is not None:
+            before, slices = run
+            print(f"Resuming the unfinished backfill up to {before}, {slices} slices")
+        else:
+            before = int(time.time())
+    slices = slices or BACKFILL_SLICES
+
+    started_at = time.perf_counter()
+    new_rows, failed = backfill(
+        sales_bot_type,
+        args.after,
+        before,
+        slices,
+        args.fetchers,
+        args.workers,
+        archive,
+    )
+    elapsed = time.perf_counter() - started_at
+
+    print(
+        f"Archived {new_rows} new {sales_bot_type.name} sales in {elapsed:.1f}s, "
+        + f"{archive.count(sales_bot_type.value)} in {args.archive}"
+    )
+    if failed > 0:
+        print(f"{failed} slice(s) failed, run the same command again to resume")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+from __future__ import annotations
+from typing import Dict, Optional
+from dataclasses import dataclass
+import threading
+import sqlite3
+import json
+import time
+import os
+
+from src.consts import (
+    OUTBOX_PATH,
+    FETCH_OVERLAP,
+    CHECKPOINT_FLUSH_EVERY,
+    CHECKPOINT_FLUSH_INTERVAL,
+)
+
+# * pre checkpoint store state, one json file per collection
+LEGACY_SINCE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sales_since"
+)
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    block: Optional[int]
+    index: Optional[int]
+    timestamp: int
+
+
+class CheckpointStore:
+    """
+    Keeps each collection's ingestion checkpoint in memory and persists
+    it as one SQLite row per collection. A write replaces the row in a
+    single transaction, so a crash leaves either the old or the new
+    checkpoint, never a torn one.
+
+    Writes are batched: `advance` only persists every
+    `CHECKPOINT_FLUSH_EVERY` updates or `CHECKPOINT_FLUSH_INTERVAL`
+    seconds, `flush` persists right away. A checkpoint that lags behind
+    the outbox only makes the next fetch overlap, and the outbox ignores
+    events it already has.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        self._checkpoints: Dict[int, Checkpoint] = {}
+        self._pending: Dict[int, int] = {}
+        self._flushed_at: Dict[int, float] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    collection INTEGER PRIMARY KEY,
+                    block INTEGER,
+                    tx_index INTEGER,
+                    timestamp INTEGER NOT NULL
+                )
+                """
+            )
+
+    def _load(self, collection: int) -> Checkpoint:
+        row = self._conn.execute(
+            "SELECT block, tx_index, timestamp FROM checkpoints WHERE collection = ?",
+            (collection,),
+        ).fetchone()
+        if row is not None:
+            return Checkpoint(*row)
+
+        # * first run with the store, migrate the collection's json file.
+        # * A collection added since has none, it starts from about now
+        since_path = os.path.join(LEGACY_SINCE_DIR, f"{collection}.json")
+        if os.path.exists(since_path):
+            with open(since_path, "r", encoding="utf-8") as f:
+                since = json.loads(f.read())
+            checkpoint = Checkpoint(since["block"], since["index"], since["timestamp"])
+        else:
+            checkpoint = Checkpoint(None, None, int(time.time()) - FETCH_OVERLAP)
+        self._write(collection, checkpoint)
+
+        return checkpoint
+
+    def _write(self, collection: int, checkpoint: Checkpoint) -> None:
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO checkpoints (collection, block, tx_index, timestamp)
+                VALUES (?, ?, ?, ?)
+                """,
+                (collection, checkpoint.block, checkpoint.index, checkpoint.timestamp),
+            )
+        self._pending[collection] = 0
+        self._flushed_at[collection] = time.monotonic()
+
+    def get(self, collection: int) -> Checkpoint:
+        with self._lock:
+            if collection not in self._checkpoints:
+                self._checkpoints[collection] = self._load(collection)
+                self._flushed_at[collection] = time.monotonic()
+            return self._checkpoints[collection]
+
+    def advance(self, collection: int, checkpoint: Checkpoint) -> None:
+        with self._lock:
+            self._checkpoints[collection] = checkpoint
+            self._pending[collection] = self._pending.get(collection, 0) + 1
+
+            is_due = (
+                self._pending[collection] >= CHECKPOINT_FLUSH_EVERY
+                or time.monotonic() - self._flushed_at.get(collection, 0.0)
+                >= CHECKPOINT_FLUSH_INTERVAL
+            )
+            if is_due:
+                self._write(collection, checkpoint)
+
+    def evict(self, collection: int) -> None:
+        # * forgets the collection, without writing it, so that the next
+        # * `get` reads what another worker may have stored since
+        with self._lock:
+            self._checkpoints.pop(collection, None)
+            self._pending.pop(collection, None)
+            self._flushed_at.pop(collection, None)
+
+    def flush(self, collection: Optional[int] = None) -> None:
+        with self._lock:
+            collections = list(self._pending) if collection is None else [collection]
+            for c in collections:
+                if self._pending.get(c, 0) > 0:
+                    self._write(c, self._checkpoints[c])
+
+
+_checkpoint_store: Optional[CheckpointStore] = None
+_checkpoint_store_lock = threading.Lock()
+
+
+def get_checkpoint_store() -> CheckpointStore:
+    global _checkpoint_store
+
+    with _checkpoint_store_lock:
+        if _checkpoint_store is None:
+            _checkpoint_store = CheckpointStore()
+        return _checkpoint_store
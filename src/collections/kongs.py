@@ -1,18 +1,11 @@
 from __future__ import annotations
-from typing import TypedDict, List, TYPE_CHECKING
+from typing import TypedDict, Optional
+from collections import Counter
+from array import array
 from pathlib import Path
 import json
+import os
 import logging
-import discord
-import src.consts
-
-# * https://stackoverflow.com/questions/744373/what-happens-when-using
-# *-mutual-or-circular-cyclic-imports-in-python
-if TYPE_CHECKING:
-    from src.opensea import SalesDatum
-
-# TODO: everything in this (collections) folder is not try
-# TODO: consider creating a class and unifying these
 
 
 # https://peps.python.org/pep-0589/#class-based-syntax
@@ -24,6 +17,135 @@ class Boosts(TypedDict):
     cumulative: int
 
 
+class BoostRanks(TypedDict):
+    # * rank of each stat among all kongs, 1 is the highest
+    shooting: int
+    vision: int
+    finish: int
+    defense: int
+    cumulative: int
+    # * the cumulative rank as a percentile, "top 3%"
+    top_percent: int
+
+
+# * order in which the stats are laid out in the binary boosts index
+BOOSTS_STATS = ("shooting", "defense", "vision", "finish", "cumulative")
+KONGS_COUNT = 10_000
+
+META_PATH = Path(__file__).parent.parent / "meta"
+KONGS_JSON_PATH = META_PATH / "kongs.json"
+KONGS_BOOSTS_INDEX_PATH = META_PATH / "kongs_boosts.bin"
+
+_boosts_index: Optional[array] = None
+_ranks_index: Optional[array] = None
+
+
+def build_kong_boosts_index(
+    json_path: Path = KONGS_JSON_PATH,
+    index_path: Optional[Path] = KONGS_BOOSTS_INDEX_PATH,
+) -> array:
+    """
+    Turns `meta/kongs.json` into a flat array of unsigned shorts,
+    `len(BOOSTS_STATS)` per kong, and writes it to `index_path`.
+    """
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        kongs = json.loads(f.read())
+
+    index = array("H", bytes(2 * len(BOOSTS_STATS) * KONGS_COUNT))
+    for kong_id, kong in enumerate(kongs[:KONGS_COUNT]):
+        boosts = kong["boosts"]
+        offset = kong_id * len(BOOSTS_STATS)
+        index[offset] = boosts["shooting"]
+        index[offset + 1] = boosts["defense"]
+        index[offset + 2] = boosts["vision"]
+        index[offset + 3] = boosts["finish"]
+        index[offset + 4] = (
+            boosts["shooting"] + boosts["vision"] + boosts["finish"] + boosts["defense"]
+        )
+
+    if index_path is not None:
+        # * write then rename, so that a reader never sees a half written index
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            index.tofile(f)
+        os.replace(tmp_path, index_path)
+
+    return index
+
+
+def load_kong_boosts_index() -> array:
+    """
+    Loads the boosts index once per process. Falls back to building it
+    from `meta/kongs.json` if the binary file is missing or out of date.
+    """
+
+    global _boosts_index
+
+    if _boosts_index is not None:
+        return _boosts_index
+
+    is_stale = KONGS_JSON_PATH.exists() and (
+        not KONGS_BOOSTS_INDEX_PATH.exists()
+        or KONGS_BOOSTS_INDEX_PATH.stat().st_mtime < KONGS_JSON_PATH.stat().st_mtime
+    )
+
+    if is_stale:
+        try:
+            _boosts_index = build_kong_boosts_index()
+        except OSError:
+            # * e.g. read-only filesystem. Keep the index in memory only
+            logging.warning("Could not persist the kong boosts index.")
+            _boosts_index = build_kong_boosts_index(index_path=None)
+    else:
+        index = array("H")
+        with open(KONGS_BOOSTS_INDEX_PATH, "rb") as f:
+            index.fromfile(f, len(BOOSTS_STATS) * KONGS_COUNT)
+        _boosts_index = index
+
+    return _boosts_index
+
+
+def build_kong_ranks_index(boosts_index: array) -> array:
+    """
+    Ranks every kong's stats among all kongs, laid out like the boosts
+    index. Kongs with the same value share a rank, the next value's rank
+    skips past them.
+
+    >>> build_kong_ranks_index(array("H", [5, 1, 9, 1, 5] * 2 + [7, 1, 1, 1, 1]))
+    array('H', [2, 1, 1, 1, 1, 2, 1, 1, 1, 1, 1, 1, 3, 1, 3])
+    """
+
+    stats_count = len(BOOSTS_STATS)
+    ranks = array("H", bytes(2 * len(boosts_index)))
+
+    for stat in range(stats_count):
+        values = boosts_index[stat::stats_count]
+        # * one pass over the distinct values, from the highest down
+        counts = Counter(values)
+        rank_of = {}
+        higher_count = 0
+        for value in sorted(counts, reverse=True):
+            rank_of[value] = higher_count + 1
+            higher_count += counts[value]
+        ranks[stat::stats_count] = array("H", (rank_of[value] for value in values))
+
+    return ranks
+
+
+def load_kong_ranks_index() -> array:
+    """
+    Derived from the boosts index once per process, so that a lookup at
+    sale time is an offset into an array rather than a scan of the kongs.
+    """
+
+    global _ranks_index
+
+    if _ranks_index is None:
+        _ranks_index = build_kong_ranks_index(load_kong_boosts_index())
+    return _ranks_index
+
+
 def get_kong_boosts(kong_id: int) -> Boosts:
     """
     >>> get_kong_boosts(0)
@@ -41,113 +163,39 @@ def get_kong_boosts(kong_id: int) -> Boosts:
     assert kong_id > -1, "kong_id must be a positive integer less than 10000"
     assert kong_id < 10_000, "kong_id must be less than 10000"
 
-    this_path = Path(__file__).parent.parent
-    meta_path = this_path / "meta" / "kongs.json"
+    index = load_kong_boosts_index()
+    offset = kong_id * len(BOOSTS_STATS)
 
-    boosts: Boosts
-    with open(meta_path, "r", encoding="utf-8") as f:
-        boosts = json.loads(f.read())[kong_id]["boosts"]
-    boosts["cumulative"] = (
-        boosts["shooting"] + boosts["vision"] + boosts["finish"] + boosts["defense"]
+    return Boosts(
+        shooting=index[offset],
+        defense=index[offset + 1],
+        vision=index[offset + 2],
+        finish=index[offset + 3],
+        cumulative=index[offset + 4],
     )
 
-    return boosts
-
-
-def build_kong_discord_message(data: List[SalesDatum]) -> discord.Embed:
-    discord_messages = []
-
-    def build_a_message(datum: SalesDatum) -> discord.Embed:
-        is_bundle_sale = len(data) > 1
-        description = (
-            f"Price: {datum.price_eth()}"
-            f" {datum.payment_symbol}, (${datum.price_usd():.2f})"
-        )
-        title = f"{datum.asset_name} Sold"
-        url = f"{src.consts.KONG_ASSET_OPENSEA_URL}{datum.token_id}"
-
-        if is_bundle_sale:
-            title = f"Bundle: '{datum.bundle_name}' Sold"
-            description = f"Bundle Total {description}"
-            url = datum.bundle_link
-
-        discord_message = discord.Embed(
-            title=title,
-            description=description,
-            url=url,
-        )
-
-        discord_message.set_thumbnail(url=datum.image_url)
-        if datum.boosts is not None:
-            discord_message.add_field(
-                name="Boost Total", value=datum.boosts["cumulative"], inline=False
-            )
-            discord_message.add_field(
-                name="Defense", value=datum.boosts["defense"], inline=True
-            )
-            discord_message.add_field(
-                name="Finish", value=datum.boosts["finish"], inline=True
-            )
-            discord_message.add_field(
-                name="Shooting", value=datum.boosts["shooting"], inline=True
-            )
-            discord_message.add_field(
-                name="Vision", value=datum.boosts["vision"], inline=True
-            )
-
-        # TODO: should not be happening. Investigate if it is happening
-        # (through logs)
-        if datum.seller is None:
-            logging.warning("No seller name for trade.")
-        if datum.buyer is None:
-            logging.warning("No buyer name for trade.")
-
-        discord_message.add_field(
-            name="Seller",
-            value=f"[{datum.seller}](https://opensea.io/{datum.seller_address})",
-            inline=False,
-        )
-        discord_message.add_field(
-            name="Buyer",
-            value=f"[{datum.buyer}](https://opensea.io/{datum.buyer_address})",
-            inline=True,
-        )
-
-        return discord_message
-
-    # * we are repeating a bundle sale message n times because
-    # * we are showing all the kongs / sneakers / rookies
-    # * sold in that particular bundle. Notice that when it
-    # * comes to building a twitter message. There is only
-    # * one tweet per whole bundle.
-    for datum in data:
-        discord_messages.append(build_a_message(datum))
-
-    return discord_messages
 
+def get_kong_boost_ranks(kong_id: int) -> BoostRanks:
+    kong_id = int(kong_id)
 
-def build_kong_twitter_message(data: List[SalesDatum]) -> str:
-    if not len(data) > 0:
-        raise ValueError("No data to build a twitter message from")
+    assert kong_id > -1, "kong_id must be a positive integer less than 10000"
+    assert kong_id < 10_000, "kong_id must be less than 10000"
 
-    is_bundle_sale = len(data) > 1
-    status_text = ""
-    datum = data[0]
+    index = load_kong_ranks_index()
+    offset = kong_id * len(BOOSTS_STATS)
+
+    return BoostRanks(
+        shooting=index[offset],
+        defense=index[offset + 1],
+        vision=index[offset + 2],
+        finish=index[offset + 3],
+        cumulative=index[offset + 4],
+        # * rounded up, so that only the very best are "top 1%"
+        top_percent=-(-index[offset + 4] * 100 // KONGS_COUNT),
+    )
 
-    if not is_bundle_sale:
-        if datum.boosts is not None:
-            status_text = (
-                f"{datum.asset_name} bought for {datum.price_eth()} {datum.payment_symbol}, "
-                + f"(${datum.price_usd():.2f})\n{datum.boosts['cumulative']} overall\n👀 "
-                + f"{datum.boosts['vision']} | 🎯 {datum.boosts['shooting']}\n💪 "
-                + f"{datum.boosts['finish']} | 🛡️ {datum.boosts['defense']} "
-                + f"{src.consts.KONG_ASSET_OPENSEA_URL}{datum.token_id}"
-            )
-    else:
-        status_text = (
-            f"{datum.bundle_name} bought for {datum.price_eth()} {datum.payment_symbol}, "
-            + f"(${datum.price_usd():.2f})\n"
-            + f"{datum.bundle_link}"
-        )
 
-    return status_text
+if __name__ == "__main__":
+    # * build step: python -m src.collections.kongs
+    build_kong_boosts_index()
+    print(f"Wrote {KONGS_BOOSTS_INDEX_PATH}")
@@ -0,0 +1,97 @@
+from typing import Dict
+
+from src.collections.renderer import CollectionRenderer, CollectionSpec, EmbedField
+import src.consts
+
+# * keyed by `SalesBotType` value
+COLLECTION_SPECS: Dict[int, CollectionSpec] = {
+    0: CollectionSpec(
+        name="KONG",
+        opensea_slug="rumble-kong-league",
+        contract_address=src.consts.KONG_CONTRACT_ADDRESS,
+        asset_url=src.consts.KONG_ASSET_OPENSEA_URL,
+        discord_webhook_env="DISCORD_KONG_WEBHOOK",
+        tweet_single=(
+            "{asset_name} bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n{boosts[cumulative]} overall, "
+            + "top {boost_ranks[top_percent]}%\n"
+            + "👀 {boosts[vision]} (#{boost_ranks[vision]}) | "
+            + "🎯 {boosts[shooting]} (#{boost_ranks[shooting]})\n"
+            + "💪 {boosts[finish]} (#{boost_ranks[finish]}) | "
+            + "🛡️ {boosts[defense]} (#{boost_ranks[defense]}) {asset_url}"
+        ),
+        tweet_bundle=(
+            "{bundle_name} bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n{bundle_link}"
+        ),
+        tweet_requires="boost_ranks",
+        has_boosts=True,
+        extra_fields=(
+            EmbedField(
+                "Boost Total",
+                "{boosts[cumulative]}, top {boost_ranks[top_percent]}% "
+                + "(#{boost_ranks[cumulative]})",
+                False,
+                "boost_ranks",
+            ),
+            EmbedField(
+                "Defense",
+                "{boosts[defense]} (#{boost_ranks[defense]})",
+                True,
+                "boost_ranks",
+            ),
+            EmbedField(
+                "Finish",
+                "{boosts[finish]} (#{boost_ranks[finish]})",
+                True,
+                "boost_ranks",
+            ),
+            EmbedField(
+                "Shooting",
+                "{boosts[shooting]} (#{boost_ranks[shooting]})",
+                True,
+                "boost_ranks",
+            ),
+            EmbedField(
+                "Vision",
+                "{boosts[vision]} (#{boost_ranks[vision]})",
+                True,
+                "boost_ranks",
+            ),
+        ),
+    ),
+    1: CollectionSpec(
+        name="SNEAKER",
+        opensea_slug="rumble-kong-league-sneakers",
+        contract_address=src.consts.SNEAKER_CONTRACT_ADDRESS,
+        asset_url=src.consts.SNEAKER_ASSET_OPENSEA_URL,
+        discord_webhook_env="DISCORD_SNEAKER_WEBHOOK",
+        tweet_single=(
+            "{asset_name} bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n {asset_url}"
+        ),
+        tweet_bundle=(
+            "Bundle '{bundle_name}' bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n {bundle_link}"
+        ),
+    ),
+    2: CollectionSpec(
+        name="ROOKIE",
+        opensea_slug="rkl-rookies",
+        contract_address=src.consts.ROOKIE_CONTRACT_ADDRESS,
+        asset_url=src.consts.ROOKIE_ASSET_OPENSEA_URL,
+        discord_webhook_env="DISCORD_ROOKIE_WEBHOOK",
+        tweet_single=(
+            "{asset_name} bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n{asset_url}"
+        ),
+        tweet_bundle=(
+            "{bundle_name} bought for {price_eth} {payment_symbol}, "
+            + "(${price_usd:.2f})\n{bundle_link}"
+        ),
+    ),
+}
+
+COLLECTION_RENDERERS: Dict[int, CollectionRenderer] = {
+    value: CollectionRenderer(spec) for value, spec in COLLECTION_SPECS.items()
+}
@@ -0,0 +1,348 @@
+from __future__ import annotations
+from typing import Callable, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+from dataclasses import dataclass
+from itertools import groupby
+from operator import attrgetter
+from string import Formatter
+import logging
+import re
+
+from src.collections.kongs import BoostRanks, Boosts
+from src.stats import LastSale, SaleStats
+import src.consts
+
+# * https://stackoverflow.com/questions/744373/what-happens-when-using
+# *-mutual-or-circular-cyclic-imports-in-python
+if TYPE_CHECKING:
+    import discord
+    from src.opensea import SalesDatum
+
+# * templates are `str.format` templates. They can use the sale wide values
+# * {bundle_name}, {bundle_link}, {price_eth}, {price_usd}, {payment_symbol},
+# * {seller}, {seller_address}, {buyer}, {buyer_address}, {stats} and the
+# * per asset {asset_name}, {token_id}, {asset_url}, {boosts}, {boost_ranks},
+# * {last_sale}, and the keys of the dict ones, e.g. {stats[floor_24h]:.4g}.
+# * Compiled templates take the values positionally, in this order
+TEMPLATE_VALUES = (
+    "bundle_name",
+    "bundle_link",
+    "price_eth",
+    "price_usd",
+    "payment_symbol",
+    "seller",
+    "seller_address",
+    "buyer",
+    "buyer_address",
+    "stats",
+    "asset_name",
+    "token_id",
+    "boosts",
+    "boost_ranks",
+    "last_sale",
+)
+ASSET_VALUES_START = TEMPLATE_VALUES.index("asset_name")
+# * the keys of the template values that are dicts
+TEMPLATE_KEYS = {
+    "stats": tuple(SaleStats.__annotations__),
+    "boosts": tuple(Boosts.__annotations__),
+    "boost_ranks": tuple(BoostRanks.__annotations__),
+    "last_sale": tuple(LastSale.__annotations__),
+}
+CONVERSIONS = ("s", "r", "a")
+
+PRICE_TEMPLATE = "Price: {price_eth} {payment_symbol}, (${price_usd:.2f})"
+
+# * a field is a value's name, then keys, e.g. "boosts[cumulative]"
+FIELD_PATTERN = re.compile(r"(\w+)((?:\[\w+\])*)")
+FIELD_KEY_PATTERN = re.compile(r"\[(\w+)\]")
+
+
+def parse_template(template: str) -> str:
+    """
+    Checks that the fields of a template are template values, with their
+    keys, and turns it into a `str.format` template of their positions.
+    Raises `ValueError` otherwise.
+
+    >>> parse_template("{asset_name} Sold for {price_usd:.2f} {{USD}}")
+    '{10} Sold for {3:.2f} {{USD}}'
+    >>> parse_template("{boosts[cumulative]}, top {boost_ranks[top]}%")
+    Traceback (most recent call last):
+    ValueError: unknown key [top] of boost_ranks in '{boosts[cumulative]}, top {boost_ranks[top]}%'
+    """
+
+    parts: List[str] = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(template):
+        parts.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field_name is None:
+            continue
+
+        match = FIELD_PATTERN.fullmatch(field_name)
+        if match is None or match[1] not in TEMPLATE_VALUES:
+            raise ValueError(f"unknown field {field_name!r} in {template!r}")
+        name, keys = match[1], FIELD_KEY_PATTERN.findall(match[2])
+        if len(keys) > 1 or any(key not in TEMPLATE_KEYS.get(name, ()) for key in keys):
+            raise ValueError(f"unknown key {match[2]} of {name} in {template!r}")
+        if conversion is not None and conversion not in CONVERSIONS:
+            raise ValueError(f"unknown conversion {conversion!r} in {template!r}")
+        if "{" in format_spec:
+            raise ValueError(f"nested fields are not supported in {template!r}")
+
+        parts.append(
+            "{"
+            + str(TEMPLATE_VALUES.index(name))
+            + match[2]
+            + ("" if conversion is None else "!" + conversion)
+            + ("" if format_spec == "" else ":" + format_spec)
+            + "}"
+        )
+    return "".join(parts)
+
+
+def compile_templates(*templates: str) -> Callable[..., Tuple[str, ...]]:
+    """
+    Compiles templates into one function of the `TEMPLATE_VALUES` that
+    renders all of them. They are checked once, and only refer to the
+    values by position, so no template can evaluate an expression.
+
+    >>> values = [None] * len(TEMPLATE_VALUES)
+    >>> values[ASSET_VALUES_START] = "Kong #1"
+    >>> compile_templates("{asset_name} Sold", "{bundle_name}")(*values)
+    ('Kong #1 Sold', 'None')
+    """
+
+    formats = tuple(parse_template(template).format for template in templates)
+    return lambda *values: tuple(render(*values) for render in formats)
+
+
+class EmbedField(NamedTuple):
+    name: str
+    value: str  # template
+    inline: bool
+    # * the field is only added when this SalesDatum attribute is not None
+    requires: Optional[str] = None
+
+
+SELLER_FIELD = EmbedField(
+    "Seller", "[{seller}](https://opensea.io/{seller_address})", False
+)
+BUYER_FIELD = EmbedField("Buyer", "[{buyer}](https://opensea.io/{buyer_address})", True)
+
+# * rolling market stats, see src/stats.py. Left out of sales ingested
+# * without them, e.g. before the stats existed
+STATS_FIELDS = (
+    EmbedField(
+        "24h Volume",
+        "{stats[volume_24h]:.2f} ETH ({stats[sales_24h]} sales)",
+        True,
+        "stats",
+    ),
+    EmbedField("24h Floor", "{stats[floor_24h]:.4g} ETH", True, "stats"),
+    EmbedField("7d Average", "{stats[average_7d]:.4g} ETH", True, "stats"),
+    EmbedField(
+        "Last Sale",
+        "{last_sale[price]:.4g} {last_sale[payment_symbol]} "
+        + "<t:{last_sale[timestamp]}:R>",
+        False,
+        "last_sale",
+    ),
+)
+TWEET_STATS = (
+    "\n24h vol {stats[volume_24h]:.2f} ETH | " + "7d avg {stats[average_7d]:.4g} ETH"
+)
+
+
+@dataclass(frozen=True)
+class CollectionSpec:
+    """
+    Everything that differs between collections. Adding a collection
+    means adding one of these to `src/collections/registry.py`, the
+    `SalesBotType` members are made from them.
+    """
+
+    name: str
+    opensea_slug: str
+    contract_address: str
+    asset_url: str  # asset url prefix, followed by the token id
+    # * name of the environment variable that holds the webhook url
+    discord_webhook_env: str
+
+    tweet_single: str
+    tweet_bundle: str
+    # * no tweet for a single sale when this SalesDatum attribute is None
+    tweet_requires: Optional[str] = None
+
+    # * the assets are kongs, each sale is enriched with their boosts and
+    # * boost ranks. Left None in the other collections' sales
+    has_boosts: bool = False
+
+    # * added between the description and the seller and buyer fields
+    extra_fields: Tuple[EmbedField, ...] = ()
+    # * added after the extra fields, and appended to tweets, when the
+    # * sale has stats
+    stats_fields: Tuple[EmbedField, ...] = STATS_FIELDS
+    tweet_stats: str = TWEET_STATS
+
+    poll_interval_bounds: Tuple[float, float] = (
+        src.consts.POLL_MIN_INTERVAL,
+        src.consts.POLL_MAX_INTERVAL,
+    )
+
+    def __post_init__(self):
+        # * a mistake in a template fails here, when the registry is
+        # * imported, rather than when a sale is rendered
+        asset_url = self.asset_url + "{token_id}"
+        templates = [
+            asset_url,
+            self.tweet_single.replace("{asset_url}", asset_url),
+            self.tweet_bundle,
+            self.tweet_stats,
+        ]
+        for field in self.extra_fields + self.stats_fields:
+            templates.append(field.value)
+            if field.requires is not None and field.requires not in TEMPLATE_VALUES:
+                raise ValueError(f"{self.name}: unknown requires {field.requires!r}")
+        if (
+            self.tweet_requires is not None
+            and self.tweet_requires not in TEMPLATE_VALUES
+        ):
+            raise ValueError(f"{self.name}: unknown requires {self.tweet_requires!r}")
+
+        for template in templates:
+            parse_template(template)
+
+
+class CollectionRenderer:
+    """
+    Renders discord embeds and tweets for one collection. The templates
+    of the spec are compiled once, with the collection's asset url baked
+    in, so rendering is a plain loop over the sale's assets.
+    """
+
+    def __init__(self, spec: CollectionSpec):
+        self.spec = spec
+
+        asset_url = spec.asset_url + "{token_id}"
+
+        self._header = compile_templates("{asset_name} Sold", PRICE_TEMPLATE, asset_url)
+        self._header_bundle = compile_templates(
+            "Bundle: '{bundle_name}' Sold", "Bundle Total " + PRICE_TEMPLATE
+        )
+
+        # * consecutive fields with the same requirement render in one call
+        self._field_groups = []
+        fields = spec.extra_fields + spec.stats_fields + (SELLER_FIELD, BUYER_FIELD)
+        for requires, group in groupby(fields, key=attrgetter("requires")):
+            group = list(group)
+            self._field_groups.append(
+                (
+                    requires,
+                    [(field.name, field.inline) for field in group],
+                    compile_templates(*(field.value for field in group)),
+                )
+            )
+
+        self._tweet_single = compile_templates(
+            spec.tweet_single.replace("{asset_url}", asset_url)
+        )
+        self._tweet_bundle = compile_templates(spec.tweet_bundle)
+        self._tweet_stats = compile_templates(spec.tweet_stats)
+
+    def _values(self, datum: SalesDatum) -> List:
+        return [
+            datum.bundle_name,
+            datum.bundle_link,
+            datum.price_eth(),
+            datum.price_usd(),
+            datum.payment_symbol,
+            datum.seller,
+            datum.seller_address,
+            datum.buyer,
+            datum.buyer_address,
+            datum.stats,
+            datum.asset_name,
+            datum.token_id,
+            datum.boosts,
+            datum.boost_ranks,
+            datum.last_sale,
+        ]
+
+    def build_discord_messages(self, data: List[SalesDatum]) -> List[discord.Embed]:
+        if not len(data) > 0:
+            return []
+
+        # * deferred, discord.py (and aiohttp with it) is the slowest import
+        # * of the bot and only rendering needs it
+        import discord
+
+        # * all the assets of a sale share its header, so only the asset
+        # * values change from one embed to the next
+        values = self._values(data[0])
+
+        # TODO: should not be happening. Investigate if it is happening
+        # (through logs)
+        if data[0].seller is None:
+            logging.warning("No seller name for trade.")
+        if data[0].buyer is None:
+            logging.warning("No buyer name for trade.")
+
+        is_bundle_sale = len(data) > 1
+        if is_bundle_sale:
+            title, description = self._header_bundle(*values)
+            url = data[0].bundle_link
+
+        # * we are repeating a bundle sale message n times because
+        # * we are showing all the kongs / sneakers / rookies
+        # * sold in that particular bundle. Notice that when it
+        # * comes to building a twitter message. There is only
+        # * one tweet per whole bundle.
+        discord_messages = []
+        for datum in data:
+            values[ASSET_VALUES_START:] = (
+                datum.asset_name,
+                datum.token_id,
+                datum.boosts,
+                datum.boost_ranks,
+                datum.last_sale,
+            )
+
+            if not is_bundle_sale:
+                title, description, url = self._header(*values)
+
+            discord_message = discord.Embed(
+                title=title,
+                description=description,
+                url=url,
+            )
+
+            if datum.image_url is not None:
+                discord_message.set_thumbnail(url=datum.image_url)
+
+            for requires, names, render in self._field_groups:
+                if requires is not None and getattr(datum, requires) is None:
+                    continue
+                for (name, inline), value in zip(names, render(*values)):
+                    discord_message.add_field(name=name, value=value, inline=inline)
+
+            discord_messages.append(discord_message)
+
+        return discord_messages
+
+    def build_twitter_message(self, data: List[SalesDatum]) -> str:
+        if not len(data) > 0:
+            raise ValueError("No data to build a twitter message from")
+
+        datum = data[0]
+        values = self._values(datum)
+
+        is_bundle_sale = len(data) > 1
+        if is_bundle_sale:
+            tweet = self._tweet_bundle(*values)[0]
+        else:
+            requires = self.spec.tweet_requires
+            if requires is not None and getattr(datum, requires) is None:
+                return ""
+            tweet = self._tweet_single(*values)[0]
+
+        if datum.stats is not None and self.spec.tweet_stats:
+            tweet += self._tweet_stats(*values)[0]
+        return tweet
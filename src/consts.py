@@ -16,7 +16,129 @@ OPENSEA_API_KEY = os.getenv("OPENSEA_API_KEY")
 
 SLEEP_TIME = 60  # in seconds
 ONE_HOUR_IN_SECONDS = 60 * SLEEP_TIME
-OPENSEA_EVENTS_URL = "https://api.opensea.io/api/v2/events/collection/"
+OUTBOX_PATH = os.getenv(
+    "OUTBOX_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "sales_since", "outbox.db"
+    ),
+)
+OUTBOX_APPEND_CHUNK_SIZE = 500  # sales written per transaction
+# * delivered sales are kept in the outbox for this long
+OUTBOX_RETENTION = 7 * 24 * ONE_HOUR_IN_SECONDS  # in seconds
+# * a sale that fails to render or post this many times in a row is
+# * dead lettered, so that the sales behind it go out
+OUTBOX_MAX_ATTEMPTS = 5
+
+# * sales ingested most recently, per collection, that are remembered
+# * to drop repeats when fetch windows overlap
+DEDUP_CAPACITY = 50_000
+# * each fetch starts this long before the newest sale already ingested
+FETCH_OVERLAP = 10 * SLEEP_TIME  # in seconds
+
+# * the ingestion checkpoint is persisted after this many updates or
+# * seconds, whichever comes first, and at the end of every cycle
+CHECKPOINT_FLUSH_EVERY = 10
+CHECKPOINT_FLUSH_INTERVAL = 30  # in seconds
+
+# * /metrics and /ready are served on this port, 0 turns them off
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+# * /ready fails when ingestion or a delivery channel lags more than this
+READY_MAX_LAG = int(os.getenv("READY_MAX_LAG", 30 * SLEEP_TIME))  # in seconds
+
+# * token image urls, see src/image_cache.py. Tokens without an image
+# * are looked up again after the negative ttl
+IMAGE_CACHE_CAPACITY = 50_000
+IMAGE_CACHE_TTL = 7 * 24 * ONE_HOUR_IN_SECONDS  # in seconds
+IMAGE_CACHE_NEGATIVE_TTL = ONE_HOUR_IN_SECONDS  # in seconds
+IMAGE_PREFETCH_PAGE_SIZE = 200  # maximum allowed by the api
+# * cache every token's image url when the bot starts
+IMAGE_PREFETCH = os.getenv("IMAGE_PREFETCH", "") not in ("", "0", "false")
+
+# * rolling market stats shown with each sale, see src/stats.py. Each
+# * window is (length, bucket) in seconds, and moves a bucket at a time
+STATS_DAY_WINDOW = (24 * ONE_HOUR_IN_SECONDS, 5 * SLEEP_TIME)
+STATS_WEEK_WINDOW = (7 * 24 * ONE_HOUR_IN_SECONDS, ONE_HOUR_IN_SECONDS)
+# * only sales paid in these count towards the stats, which are in ETH
+STATS_SYMBOLS = ("ETH", "WETH")
+
+# * historical backfill, see src/backfill.py. It only writes to its own
+# * archive, never to the outbox, so nothing it fetches is posted
+ARCHIVE_PATH = os.getenv(
+    "ARCHIVE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "sales_since", "archive.db"
+    ),
+)
+BACKFILL_SLICES = 16  # the range is split in this many, each with its own cursor
+BACKFILL_FETCHERS = 4  # slices fetched at once
+
+# * opt-in profiling of cycles, see src/profiling.py. The first
+# * PROFILE_CYCLES cycles are profiled, then a PROFILE_SAMPLE_RATE share
+PROFILE_CYCLES = int(os.getenv("PROFILE_CYCLES", 0))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_MODE = os.getenv("PROFILE_MODE") or "cpu"  # cpu, memory or both
+PROFILE_DIR = os.getenv("PROFILE_DIR") or "."  # where the log files go
+PROFILE_TOP_ALLOCATIONS = 25
+
+# * push ingestion from OpenSea's Stream API, see src/opensea_stream.py.
+# * Polls keep running alongside, to fetch what a disconnect missed
+OPENSEA_STREAM = os.getenv("OPENSEA_STREAM", "") not in ("", "0", "false")
+STREAM_HEARTBEAT_INTERVAL = 30  # in seconds
+
+# * a failing loop is retried after an exponential, jittered backoff
+# * between these bounds. After SUPERVISOR_FAILURE_THRESHOLD failures in
+# * a row its circuit opens: it waits SUPERVISOR_COOLDOWN, then lets one
+# * probe through, which closes the circuit or opens it again
+SUPERVISOR_BACKOFF_BASE = 5  # in seconds
+SUPERVISOR_BACKOFF_MAX = 5 * SLEEP_TIME  # in seconds
+SUPERVISOR_FAILURE_THRESHOLD = 5
+SUPERVISOR_COOLDOWN = SLEEP_TIME  # in seconds
+# * a supervised run that lasted this long before failing was healthy,
+# * its failure starts over from the shortest backoff
+SUPERVISOR_HEALTHY_RUN = SUPERVISOR_BACKOFF_MAX  # in seconds
+
+# * worker mode, see src/sharding.py. Workers split the collections
+# * between them, each owning a collection through a lease of LEASE_TTL
+# * seconds that it renews every LEASE_RENEW_INTERVAL
+LEASE_PATH = os.getenv("LEASE_PATH", OUTBOX_PATH)
+# * "module:Class" of a `LeaseStore` shared across hosts, SQLite otherwise
+LEASE_BACKEND = os.getenv("LEASE_BACKEND")
+LEASE_TTL = int(os.getenv("LEASE_TTL", 30))  # in seconds
+LEASE_RENEW_INTERVAL = LEASE_TTL / 3  # in seconds
+# * stable across restarts, a worker takes its leases back right away
+WORKER_ID = os.getenv("WORKER_ID")
+
+# * default bounds of the adaptive poll interval, see src/scheduler.py
+POLL_MIN_INTERVAL = int(os.getenv("POLL_MIN_INTERVAL", 30))  # in seconds
+POLL_MAX_INTERVAL = int(os.getenv("POLL_MAX_INTERVAL", 10 * SLEEP_TIME))  # in seconds
+# * overridable, e.g. to point the bot at the stand-ins in bench/stand_in.py
+OPENSEA_API_URL = os.getenv("OPENSEA_API_URL") or "https://api.opensea.io"
+COINBASE_API_URL = os.getenv("COINBASE_API_URL") or "https://api.coinbase.com"
+TWITTER_API_URL = os.getenv("TWITTER_API_URL") or "https://api.twitter.com"
+OPENSEA_STREAM_URL = (
+    os.getenv("OPENSEA_STREAM_URL") or "wss://stream.openseabeta.com/socket/websocket"
+)
+
+OPENSEA_EVENTS_URL = f"{OPENSEA_API_URL}/api/v2/events/collection/"
+OPENSEA_NFT_URL = f"{OPENSEA_API_URL}/api/v2/chain/ethereum/contract/"
+OPENSEA_EVENTS_PAGE_SIZE = 50  # maximum allowed by the api
+OPENSEA_COLLECTION_URL = f"{OPENSEA_API_URL}/api/v2/collection/"
+COINBASE_EXCHANGE_RATES_URL = f"{COINBASE_API_URL}/v2/exchange-rates?currency=USD"
+TWITTER_TWEETS_URL = f"{TWITTER_API_URL}/2/tweets"
+
+# * shared http client. See src/http_client.py
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))  # in seconds
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_BASE = 0.5  # in seconds
+HTTP_BACKOFF_MAX = 30  # in seconds
+HTTP_POOL_MAXSIZE = 10  # connections kept alive per host
+
+# * exchange rates younger than the ttl are served as is, older ones are
+# * served while being refreshed, up to the max staleness
+PRICE_ORACLE_TTL = int(os.getenv("PRICE_ORACLE_TTL", 60))  # in seconds
+PRICE_ORACLE_MAX_STALENESS = int(
+    os.getenv("PRICE_ORACLE_MAX_STALENESS", ONE_HOUR_IN_SECONDS)
+)  # in seconds
 
 KONG_CONTRACT_ADDRESS = "0xef0182dc0574cd5874494a120750fd222fdb909a"
 SNEAKER_CONTRACT_ADDRESS = "0x60E4d786628Fea6478F785A6d7e704777c86a7c6"
@@ -0,0 +1,114 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional
+from collections import OrderedDict
+import threading
+import sqlite3
+import time
+
+from src.consts import OUTBOX_PATH, DEDUP_CAPACITY
+from src.opensea import get_event_key
+
+
+class DedupIndex:
+    """
+    Bounded set of the most recently ingested sales per collection,
+    keyed by `get_event_key`. Membership checks are O(1) dict lookups,
+    and only the newest `capacity` keys of a collection are kept, in
+    memory and in SQLite, so the index survives restarts.
+
+    This is what lets ingestion overlap its fetch windows: a sale seen
+    in the previous window is dropped before it reaches the outbox.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH, capacity: int = DEDUP_CAPACITY):
+        self.capacity = capacity
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._keys: Dict[int, OrderedDict[str, None]] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS seen_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    collection INTEGER NOT NULL,
+                    event_key TEXT NOT NULL,
+                    seen_at REAL NOT NULL,
+                    UNIQUE (collection, event_key)
+                )
+                """
+            )
+
+    def _collection_keys(self, collection: int) -> OrderedDict[str, None]:
+        if collection not in self._keys:
+            rows = self._conn.execute(
+                """
+                SELECT event_key FROM seen_events WHERE collection = ?
+                ORDER BY id DESC LIMIT ?
+                """,
+                (collection, self.capacity),
+            ).fetchall()
+            self._keys[collection] = OrderedDict(
+                (event_key, None) for (event_key,) in reversed(rows)
+            )
+        return self._keys[collection]
+
+    def evict(self, collection: int) -> None:
+        # * the keys are read from SQLite again on next use
+        with self._lock:
+            self._keys.pop(collection, None)
+
+    def filter_new(self, collection: int, events: Iterable[Dict]) -> List[Dict]:
+        """
+        Returns the events that have not been seen. Does not mark them,
+        call `add` once they are safely stored.
+        """
+
+        with self._lock:
+            keys = self._collection_keys(collection)
+            return [event for event in events if get_event_key(event) not in keys]
+
+    def add(self, collection: int, events: Iterable[Dict]) -> None:
+        event_keys = [get_event_key(event) for event in events]
+        if len(event_keys) == 0:
+            return
+
+        with self._lock, self._conn:
+            keys = self._collection_keys(collection)
+            for event_key in event_keys:
+                keys[event_key] = None
+                keys.move_to_end(event_key)
+            while len(keys) > self.capacity:
+                keys.popitem(last=False)
+
+            now = time.time()
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO seen_events (collection, event_key, seen_at)
+                VALUES (?, ?, ?)
+                """,
+                [(collection, event_key, now) for event_key in event_keys],
+            )
+            self._conn.execute(
+                """
+                DELETE FROM seen_events WHERE collection = ? AND id <= (
+                    SELECT id FROM seen_events WHERE collection = ?
+                    ORDER BY id DESC LIMIT 1 OFFSET ?
+                )
+                """,
+                (collection, collection, self.capacity),
+            )
+
+
+_dedup_index: Optional[DedupIndex] = None
+_dedup_index_lock = threading.Lock()
+
+
+def get_dedup_index() -> DedupIndex:
+    global _dedup_index
+
+    with _dedup_index_lock:
+        if _dedup_index is None:
+            _dedup_index = DedupIndex()
+        return _dedup_index
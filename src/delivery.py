@@ -0,0 +1,453 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterable, List, Optional, TYPE_CHECKING
+from dataclasses import dataclass, field
+from abc import ABC, abstractmethod
+import threading
+import logging
+import queue
+import time
+
+import requests
+
+from src.consts import (
+    TWEEPY_API_KEY,
+    TWEEPY_API_SECRET,
+    TWEEPY_ACCESS_TOKEN,
+    TWEEPY_ACCESS_TOKEN_SECRET,
+    TWITTER_TWEETS_URL,
+)
+from src.http_client import http_client, parse_retry_after
+from src.metrics import time_stage
+
+if TYPE_CHECKING:
+    import discord
+
+# * https://discord.com/developers/docs/resources/channel#embed-object-embed-limits
+DISCORD_MAX_EMBEDS_PER_MESSAGE = 10
+DISCORD_MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+
+@dataclass
+class EmbedBatch:
+    embeds: List[discord.Embed] = field(default_factory=list)
+    # * how many groups, counting from the first one, are fully
+    # * delivered once this batch and all the ones before it are
+    groups_done: int = 0
+    chars: int = 0
+
+    def fits(self, embeds: List[discord.Embed]) -> bool:
+        return (
+            len(self.embeds) + len(embeds) <= DISCORD_MAX_EMBEDS_PER_MESSAGE
+            and self.chars + sum(len(embed) for embed in embeds)
+            <= DISCORD_MAX_EMBED_CHARS_PER_MESSAGE
+        )
+
+    def add(self, embed: discord.Embed) -> None:
+        self.embeds.append(embed)
+        self.chars += len(embed)
+
+
+class EmbedPacker:
+    """
+    Packs groups of embeds (one group per sale) into as few webhook
+    messages as Discord's limits allow. Groups keep their order and a
+    group is never interleaved with another: it either shares a message
+    whole or, if it can't fit in a message of its own, spans consecutive
+    messages.
+    """
+
+    def __init__(self):
+        self.batch = EmbedBatch()
+
+    def _flush(self, ready: List[EmbedBatch]) -> None:
+        if len(self.batch.embeds) > 0:
+            ready.append(self.batch)
+        self.batch = EmbedBatch(groups_done=self.batch.groups_done)
+
+    def add(self, group: List[discord.Embed]) -> List[EmbedBatch]:
+        """
+        Adds a group and returns the batches that can't take any more
+        embeds.
+        """
+
+        ready: List[EmbedBatch] = []
+
+        if not self.batch.fits(group):
+            # * whole groups start a fresh message, and so does a group
+            # * too big for any one message, which is then split in order
+            self._flush(ready)
+
+        for embed in group:
+            if not self.batch.fits([embed]):
+                self._flush(ready)
+            self.batch.add(embed)
+        self.batch.groups_done += 1
+
+        return ready
+
+    def flush(self) -> List[EmbedBatch]:
+        ready: List[EmbedBatch] = []
+        self._flush(ready)
+        return ready
+
+
+def pack_embeds(groups: Iterable[List[discord.Embed]]) -> List[EmbedBatch]:
+    packer = EmbedPacker()
+
+    batches: List[EmbedBatch] = []
+    for group in groups:
+        batches.extend(packer.add(group))
+    batches.extend(packer.flush())
+
+    return batches
+
+
+class RateLimitBucket:
+    """
+    State of a webhook's Discord rate limit bucket, as reported by the
+    `X-RateLimit-*` headers of its last response.
+    """
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0  # time.monotonic()
+
+    def wait_time(self) -> float:
+        if self.remaining is None or self.remaining > 0:
+            return 0.0
+        return max(0.0, self.reset_at - time.monotonic())
+
+    def update(self, resp: requests.Response) -> None:
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        reset_after = resp.headers.get("X-RateLimit-Reset-After")
+
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset_after is not None:
+            self.reset_at = time.monotonic() + float(reset_after)
+
+        if resp.status_code == 429:
+            retry_after = resp.headers.get("Retry-After")
+            try:
+                retry_after = resp.json().get("retry_after", retry_after)
+            except ValueError:
+                pass
+            self.remaining = 0
+            self.reset_at = time.monotonic() + float(retry_after or 1)
+
+
+class TwitterRateLimit:
+    """
+    Tweet budget of the account, as reported by the `x-rate-limit-*`
+    (15 minute window) and `x-user-limit-24hour-*` headers of its last
+    response. Resets are epoch seconds.
+    """
+
+    def __init__(self):
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0  # time.time()
+        self.daily_remaining: Optional[int] = None
+        self.daily_reset_at = 0.0  # time.time()
+
+    def wait_time(self) -> float:
+        now = time.time()
+        wait_time = 0.0
+        if self.remaining == 0:
+            wait_time = max(wait_time, self.reset_at - now)
+        if self.daily_remaining == 0:
+            wait_time = max(wait_time, self.daily_reset_at - now)
+        return wait_time
+
+    def update(self, resp: requests.Response) -> None:
+        def header(name: str) -> Optional[int]:
+            value = resp.headers.get(name)
+            return int(value) if value is not None and value.isdigit() else None
+
+        remaining = header("x-rate-limit-remaining")
+        reset_at = header("x-rate-limit-reset")
+        daily_remaining = header("x-user-limit-24hour-remaining")
+        daily_reset_at = header("x-user-limit-24hour-reset")
+
+        if remaining is not None:
+            self.remaining = remaining
+        if reset_at is not None:
+            self.reset_at = float(reset_at)
+        if daily_remaining is not None:
+            self.daily_remaining = daily_remaining
+        if daily_reset_at is not None:
+            self.daily_reset_at = float(daily_reset_at)
+
+        if resp.status_code == 429 and self.wait_time() <= 0:
+            # * throttled without a usable reset, fall back to Retry-After
+            retry_after = parse_retry_after(resp)
+            self.remaining = 0
+            self.reset_at = time.time() + (60 if retry_after is None else retry_after)
+
+
+@dataclass
+class DeliveryItem:
+    payload: Any
+    group: DeliveryGroup
+    on_delivered: Optional[Callable[[Any], None]] = None
+    is_wanted: Optional[Callable[[], bool]] = None
+
+
+class DeliveryGroup:
+    """
+    The payloads one caller puts on a queue, e.g. a collection's claim,
+    and waits on. Queues shared by collections, like the Twitter
+    account's, keep each collection's completion and errors apart.
+    """
+
+    def __init__(self, delivery_queue: DeliveryQueue):
+        self._delivery_queue = delivery_queue
+        self._done = threading.Condition()
+        self._pending = 0
+        self._error: Optional[Exception] = None
+
+    def put(
+        self,
+        payload: Any,
+        on_delivered: Optional[Callable[[Any], None]] = None,
+        is_wanted: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        with self._done:
+            self._pending += 1
+        self._delivery_queue._queue.put(
+            DeliveryItem(payload, self, on_delivered, is_wanted)
+        )
+
+    def wait(self) -> None:
+        """
+        Blocks until everything put in the group is delivered or dropped,
+        and raises the error that dropped it, if any.
+        """
+
+        with self._done:
+            self._done.wait_for(lambda: self._pending == 0)
+
+            if self._error is not None:
+                error, self._error = self._error, None
+                raise error
+
+    def _fail(self, error: Exception) -> None:
+        with self._done:
+            self._error = error
+
+    def _task_done(self) -> None:
+        with self._done:
+            self._pending -= 1
+            self._done.notify_all()
+
+
+class DeliveryQueue(ABC):
+    """
+    Sends payloads to one destination, in order, from a worker thread,
+    so that fetching and rendering carry on while posts are in flight.
+    Payloads are put and waited on through a `DeliveryGroup`.
+
+    If a send fails, the payloads of its group queued behind it are
+    dropped, so that nothing is posted out of order, and the group's
+    `wait` raises the error. Other groups carry on. Whatever was dropped
+    is still in the outbox and is claimed again next cycle. A payload
+    whose `is_wanted` returns False when its turn comes is dropped too,
+    e.g. once another worker took its collection over.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue[DeliveryItem] = queue.Queue()
+        threading.Thread(target=self._work, daemon=True).start()
+
+    def group(self) -> DeliveryGroup:
+        return DeliveryGroup(self)
+
+    @abstractmethod
+    def _send(self, payload: Any) -> None:
+        # * posts one payload, raising if it was not delivered
+        ...
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                is_wanted = item.is_wanted is None or item.is_wanted()
+                if item.group._error is None and is_wanted:
+                    self._send(item.payload)
+                    if item.on_delivered is not None:
+                        item.on_delivered(item.payload)
+            except Exception as e:
+                logging.exception("")
+                item.group._fail(e)
+            finally:
+                item.group._task_done()
+
+
+class DiscordDeliveryQueue(DeliveryQueue):
+    """
+    Sends embed batches to one webhook. The worker waits only as long as
+    the webhook's rate limit bucket requires and retries 429s after their
+    `retry_after`.
+    """
+
+    def __init__(self, webhook_url: str):
+        self.webhook_url = webhook_url
+        self.bucket = RateLimitBucket()
+        super().__init__()
+
+    def _send(self, batch: EmbedBatch) -> None:
+        payload = {"embeds": [embed.to_dict() for embed in batch.embeds]}
+
+        while True:
+            wait_time = self.bucket.wait_time()
+            if wait_time > 0:
+                logging.info(f"Discord bucket exhausted, waiting {wait_time:.2f}s")
+                time.sleep(wait_time)
+
+            # * the bucket, not the http client, decides when to retry a 429
+            with time_stage("discord_send"):
+                resp = http_client.post(self.webhook_url, json=payload, max_retries=0)
+            self.bucket.update(resp)
+
+            if resp.status_code == 429:
+                logging.warning(
+                    f"Discord rate limited us, retrying in {self.bucket.wait_time():.2f}s"
+                )
+                continue
+
+            resp.raise_for_status()
+            return
+
+
+_discord_delivery_queues: Dict[str, DiscordDeliveryQueue] = {}
+_discord_delivery_queues_lock = threading.Lock()
+
+
+def get_discord_delivery_queue(webhook_url: str) -> DiscordDeliveryQueue:
+    # * one long lived queue per webhook, so its bucket outlives a cycle
+    with _discord_delivery_queues_lock:
+        if webhook_url not in _discord_delivery_queues:
+            _discord_delivery_queues[webhook_url] = DiscordDeliveryQueue(webhook_url)
+        return _discord_delivery_queues[webhook_url]
+
+
+# * a post rejected with one of these is rejected again however often it
+# * is retried. Auth errors and 404s are left out, they are about the
+# * webhook or the account rather than the sale, so every sale would be
+NON_RETRYABLE_STATUSES = (400, 413)
+
+
+def is_non_retryable(error: Exception) -> bool:
+    response = getattr(error, "response", None)
+    return (
+        isinstance(error, requests.RequestException)
+        and response is not None
+        and response.status_code in NON_RETRYABLE_STATUSES
+    )
+
+
+class SaleError(Exception):
+    """
+    A sale in the outbox that cannot be delivered as it is, e.g. it does
+    not parse or render. Raised from the error it wraps.
+    """
+
+
+def is_duplicate_tweet(resp: requests.Response) -> bool:
+    return resp.status_code == 403 and "duplicate content" in resp.text
+
+
+class TwitterDeliveryQueue(DeliveryQueue):
+    """
+    Posts tweets for the account, from its own worker and with its own
+    rate limit budget, so a throttled Twitter never holds up Discord.
+
+    Twitter rejects a tweet identical to a recent one, so resending
+    after a timeout or a 5xx can't tweet twice: the retries happen
+    here, with backoff, and a duplicate counts as delivered.
+    """
+
+    def __init__(self, tweets_url: str, auth, max_retries: int):
+        self.tweets_url = tweets_url
+        self.auth = auth
+        self.max_retries = max_retries
+        self.rate_limit = TwitterRateLimit()
+        super().__init__()
+
+    def _send(self, text: str) -> None:
+        # * nothing to tweet, e.g. a kong whose boosts are unknown
+        if text == "":
+            return
+
+        attempt = 0
+        while True:
+            wait_time = self.rate_limit.wait_time()
+            if wait_time > 0:
+                logging.info(f"Twitter budget exhausted, waiting {wait_time:.1f}s")
+                time.sleep(wait_time)
+
+            try:
+                with time_stage("twitter_send"):
+                    resp = http_client.post(
+                        self.tweets_url,
+                        json={"text": text},
+                        auth=self.auth,
+                        max_retries=0,
+                    )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+            else:
+                self.rate_limit.update(resp)
+
+                if resp.status_code == 429:
+                    logging.warning("Twitter rate limited us")
+                    continue
+                if is_duplicate_tweet(resp):
+                    logging.info("Tweet was already posted")
+                    return
+                if resp.status_code < 500 or attempt >= self.max_retries:
+                    resp.raise_for_status()
+                    return
+
+            delay = http_client.backoff(attempt)
+            attempt += 1
+            logging.warning(f"Tweet failed, retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+_twitter_delivery_queue: Optional[TwitterDeliveryQueue] = None
+_twitter_delivery_queue_lock = threading.Lock()
+
+
+def is_twitter_enabled() -> bool:
+    # * tweets are only sent when every key is set
+    return all(
+        (
+            TWEEPY_API_KEY,
+            TWEEPY_API_SECRET,
+            TWEEPY_ACCESS_TOKEN,
+            TWEEPY_ACCESS_TOKEN_SECRET,
+        )
+    )
+
+
+def get_twitter_delivery_queue() -> TwitterDeliveryQueue:
+    # * one queue for the account, every collection tweets from the same
+    # * budget
+    global _twitter_delivery_queue
+
+    with _twitter_delivery_queue_lock:
+        if _twitter_delivery_queue is None:
+            # * deferred, only needed when tweeting is enabled
+            from tweepy import OAuth1UserHandler
+
+            auth = OAuth1UserHandler(
+                TWEEPY_API_KEY,
+                TWEEPY_API_SECRET,
+                TWEEPY_ACCESS_TOKEN,
+                TWEEPY_ACCESS_TOKEN_SECRET,
+            ).apply_auth()
+            _twitter_delivery_queue = TwitterDeliveryQueue(
+                TWITTER_TWEETS_URL, auth, http_client.max_retries
+            )
+        return _twitter_delivery_queue
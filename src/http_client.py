@@ -0,0 +1,169 @@
+from __future__ import annotations
+from typing import Dict, Optional
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.consts import (
+    HTTP_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE,
+    HTTP_BACKOFF_MAX,
+    HTTP_POOL_MAXSIZE,
+)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# * a POST that reached the server may have been processed (e.g. a
+# * discord message sent), so only retry it when we were told to
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+@dataclass
+class RateLimitState:
+    # * from the last X-RateLimit-* headers a host sent, if any
+    remaining: Optional[int] = None
+    reset_after: Optional[float] = None
+    # * 429s received so far and the last Retry-After that came with one
+    throttled_count: int = 0
+    retry_after: Optional[float] = None
+
+
+def parse_retry_after(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient(requests.Session):
+    """
+    `requests.Session` that keeps a connection pool per host alive between
+    calls, applies a default timeout and retries failed requests with
+    jittered exponential backoff, honouring `Retry-After`.
+    """
+
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_base: float = HTTP_BACKOFF_BASE,
+        backoff_max: float = HTTP_BACKOFF_MAX,
+        pool_maxsize: int = HTTP_POOL_MAXSIZE,
+    ):
+        super().__init__()
+
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # * connection counts live on the pools, so we keep enough pools
+        # * around that a host's pool is never evicted between calls
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_maxsize)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self.retries_count = 0
+        self.rate_limits: Dict[str, RateLimitState] = {}
+
+    def backoff(self, attempt: int) -> float:
+        # * "full jitter": sleep anywhere between 0 and the exponential cap
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    def rate_limit(self, host: str) -> RateLimitState:
+        return self.rate_limits.setdefault(host, RateLimitState())
+
+    def _record_rate_limit(self, host: str, resp: requests.Response) -> None:
+        state = self.rate_limit(host)
+
+        remaining = resp.headers.get("X-RateLimit-Remaining")
+        if remaining is not None and remaining.isdigit():
+            state.remaining = int(remaining)
+
+        reset_after = resp.headers.get("X-RateLimit-Reset-After")
+        if reset_after is not None:
+            try:
+                state.reset_after = float(reset_after)
+            except ValueError:
+                pass
+
+        if resp.status_code == 429:
+            state.throttled_count += 1
+            state.retry_after = parse_retry_after(resp)
+
+    def request(
+        self, method, url, *args, max_retries: Optional[int] = None, **kwargs
+    ) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        if max_retries is None:
+            max_retries = self.max_retries
+        is_idempotent = method.upper() in IDEMPOTENT_METHODS
+        host = urlsplit(url).netloc
+
+        attempt = 0
+        while True:
+            try:
+                resp = super().request(method, url, *args, **kwargs)
+                self._record_rate_limit(host, resp)
+            except (requests.ConnectionError, requests.Timeout):
+                if not is_idempotent or attempt >= max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            else:
+                is_retryable = resp.status_code == 429 or (
+                    is_idempotent and resp.status_code in RETRY_STATUSES
+                )
+                if not is_retryable or attempt >= max_retries:
+                    return resp
+                retry_after = parse_retry_after(resp)
+                delay = (
+                    retry_after if retry_after is not None else self.backoff(attempt)
+                )
+
+            attempt += 1
+            self.retries_count += 1
+            logging.warning(f"{method} {host} failed, retry {attempt} in {delay:.2f}s")
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Requests sent and connections opened per host. Every request
+        beyond the first on a connection skipped a TCP + TLS handshake.
+        """
+
+        stats: Dict[str, Dict[str, int]] = {}
+        for adapter in set(self.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host_stats = stats.setdefault(
+                    pool.host, {"requests": 0, "connections": 0, "reused": 0}
+                )
+                host_stats["requests"] += pool.num_requests
+                host_stats["connections"] += pool.num_connections
+                host_stats["reused"] += pool.num_requests - pool.num_connections
+
+        return stats
+
+
+# * every outbound call in the process goes through this client
+http_client = HttpClient()
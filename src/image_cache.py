@@ -0,0 +1,284 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from collections import OrderedDict
+import threading
+import logging
+import sqlite3
+import time
+import sys
+
+import requests
+
+from src.consts import (
+    OUTBOX_PATH,
+    OPENSEA_API_KEY,
+    OPENSEA_COLLECTION_URL,
+    IMAGE_CACHE_CAPACITY,
+    IMAGE_CACHE_TTL,
+    IMAGE_CACHE_NEGATIVE_TTL,
+    IMAGE_PREFETCH_PAGE_SIZE,
+)
+from src.http_client import http_client
+from src.util import fetch_token_image_url
+
+# * (contract address, token id)
+ImageKey = Tuple[str, str]
+# * (image url, or None if the token has none, fetched at)
+ImageEntry = Tuple[Optional[str], float]
+
+# * reads are persisted with the next write, or once this many pile up
+TOUCHED_FLUSH_SIZE = 100
+
+
+class ImageUrlCache:
+    """
+    Persistent LRU cache of token image urls, keyed by (contract, token
+    id). Token images rarely change, so a url is reused for `ttl`
+    seconds. Tokens without an image, e.g. unrevealed rookies, are
+    remembered too, for the shorter `negative_ttl`, so that they are not
+    looked up on every sale.
+
+    The most recently used `capacity` entries are kept, in memory and in
+    SQLite, so the cache survives restarts.
+    """
+
+    def __init__(
+        self,
+        path: str = OUTBOX_PATH,
+        capacity: int = IMAGE_CACHE_CAPACITY,
+        ttl: float = IMAGE_CACHE_TTL,
+        negative_ttl: float = IMAGE_CACHE_NEGATIVE_TTL,
+        fetch: Callable[[str, str], Optional[str]] = fetch_token_image_url,
+    ):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._fetch = fetch
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._entries: OrderedDict[ImageKey, ImageEntry] = OrderedDict()
+        # * last use of the entries read since the last write
+        self._touched: Dict[ImageKey, float] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_urls (
+                    contract TEXT NOT NULL,
+                    token_id TEXT NOT NULL,
+                    image_url TEXT,
+                    fetched_at REAL NOT NULL,
+                    used_at REAL NOT NULL,
+                    PRIMARY KEY (contract, token_id)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS image_urls_used_at ON image_urls (used_at)
+                """
+            )
+
+    def _is_fresh(self, entry: ImageEntry, now: float) -> bool:
+        image_url, fetched_at = entry
+        ttl = self.ttl if image_url is not None else self.negative_ttl
+        return now - fetched_at < ttl
+
+    def _remember(self, key: ImageKey, entry: ImageEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def _flush_touched(self) -> None:
+        self._conn.executemany(
+            """
+            UPDATE image_urls SET used_at = MAX(used_at, ?)
+            WHERE contract = ? AND token_id = ?
+            """,
+            [(used_at, *key) for key, used_at in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def _lookup(self, key: ImageKey) -> Optional[ImageEntry]:
+        with self._lock:
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCHED_FLUSH_SIZE:
+                with self._conn:
+                    self._flush_touched()
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+            row = self._conn.execute(
+                """
+                SELECT image_url, fetched_at FROM image_urls
+                WHERE contract = ? AND token_id = ?
+                """,
+                key,
+            ).fetchone()
+            if row is None:
+                return None
+
+            entry = (row[0], row[1])
+            self._remember(key, entry)
+            return entry
+
+    def put_many(self, entries: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        now = time.time()
+        rows = [
+            (contract.lower(), str(token_id), image_url or None, now, now)
+            for contract, token_id, image_url in entries
+        ]
+        if len(rows) == 0:
+            return
+
+        with self._lock, self._conn:
+            for contract, token_id, image_url, fetched_at, _ in rows:
+                self._remember((contract, token_id), (image_url, fetched_at))
+
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO image_urls
+                (contract, token_id, image_url, fetched_at, used_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self._flush_touched()
+            # * least recently used first
+            self._conn.execute(
+                """
+                DELETE FROM image_urls WHERE rowid IN (
+                    SELECT rowid FROM image_urls ORDER BY used_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.capacity,),
+            )
+
+    def get(self, contract: str, token_id) -> Optional[str]:
+        """
+        The token's image url, fetched from OpenSea if it is not cached
+        or has expired. None if the token has no image, or if it could
+        not be fetched.
+        """
+
+        key = (contract.lower(), str(token_id))
+        entry = self._lookup(key)
+        if entry is not None and self._is_fresh(entry, time.time()):
+            return entry[0]
+
+        try:
+            image_url = self._fetch(key[1], contract)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                logging.warning(f"Could not fetch the image of {key}: {e}")
+                return None
+            image_url = None
+        except Exception as e:
+            # * not cached, the next sale of the token tries again
+            logging.warning(f"Could not fetch the image of {key}: {e}")
+            return None
+
+        self.put_many([(contract, key[1], image_url)])
+        return image_url or None
+
+    def prefetch(self, opensea_slug: str, contract: str) -> int:
+        """
+        Caches the image url of every token in the collection, a page of
+        `IMAGE_PREFETCH_PAGE_SIZE` tokens per request. Returns the number
+        of tokens cached.
+        """
+
+        url = f"{OPENSEA_COLLECTION_URL}{opensea_slug}/nfts"
+        params: Dict = {"limit": IMAGE_PREFETCH_PAGE_SIZE}
+        headers = {"accept": "application/json", "x-api-key": OPENSEA_API_KEY}
+
+        count = 0
+        while True:
+            response = http_client.get(url, params=params, headers=headers)
+            response.raise_for_status()
+            response_json = response.json()
+
+            nfts: List[Dict] = response_json.get("nfts", [])
+            self.put_many(
+                (
+                    nft.get("contract") or contract,
+                    nft["identifier"],
+                    nft.get("image_url"),
+                )
+                for nft in nfts
+            )
+            count += len(nfts)
+
+            cursor = response_json.get("next")
+            if not cursor or len(nfts) == 0:
+                return count
+            params["next"] = cursor
+
+
+_image_cache: Optional[ImageUrlCache] = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageUrlCache:
+    global _image_cache
+
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageUrlCache()
+        return _image_cache
+
+
+def fill_missing_image_urls(events: Iterable[Dict], contract_address: str) -> int:
+    """
+    Fills in, in place, the image urls that sale events came without,
+    from the cache. Returns the number of images filled in.
+    """
+
+    cache = get_image_cache()
+
+    filled = 0
+    for event in events:
+        if event.get("asset_bundle") is not None:
+            assets = [
+                (
+                    asset,
+                    (asset.get("asset_contract") or {}).get("address"),
+                    asset["token_id"],
+                )
+                for asset in event["asset_bundle"]["assets"]
+            ]
+        else:
+            nft = event["nft"]
+            assets = [(nft, nft.get("contract"), nft["identifier"])]
+
+        for asset, contract, token_id in assets:
+            if asset.get("image_url"):
+                continue
+            image_url = cache.get(contract or contract_address, token_id)
+            if image_url is not None:
+                asset["image_url"] = image_url
+                filled += 1
+
+    return filled
+
+
+if __name__ == "__main__":
+    # * bulk prefetch: python -m src.image_cache [all | 0 1 2]
+    from src.collections.registry import COLLECTION_SPECS
+
+    args = sys.argv[1:]
+    values = (
+        list(COLLECTION_SPECS)
+        if len(args) == 0 or args == ["all"]
+        else [int(arg) for arg in args]
+    )
+    for value in values:
+        spec = COLLECTION_SPECS[value]
+        count = get_image_cache().prefetch(spec.opensea_slug, spec.contract_address)
+        print(f"Cached {count} {spec.name} image urls")
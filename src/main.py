@@ -1,116 +1,629 @@
 from __future__ import annotations
+from contextlib import contextmanager
+import asyncio
+import functools
+import itertools
+import threading
 import time
 import sys
-import json
 import logging
-from typing import List
-import os
-
-import discord
 import requests
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
-from src.consts import OPENSEA_EVENTS_URL, SLEEP_TIME, ONE_HOUR_IN_SECONDS
+from src.consts import (
+    SUPERVISOR_BACKOFF_MAX,
+    OUTBOX_APPEND_CHUNK_SIZE,
+    FETCH_OVERLAP,
+    OUTBOX_RETENTION,
+    OUTBOX_MAX_ATTEMPTS,
+    METRICS_PORT,
+    READY_MAX_LAG,
+    IMAGE_PREFETCH,
+    OPENSEA_STREAM,
+)
+from src.http_client import http_client
+from src.scheduler import AdaptiveScheduler
+from src.delivery import (
+    EmbedBatch,
+    EmbedPacker,
+    SaleError,
+    get_discord_delivery_queue,
+    get_twitter_delivery_queue,
+    is_non_retryable,
+    is_twitter_enabled,
+)
 from src.sales_bot import SalesBotType, SalesBot
 from src.util import handle_exception
-from src.opensea import SalesDatum
+from src.opensea import (
+    SalesDatum,
+    get_event_block_and_index,
+    get_event_timestamp,
+    iter_sale_events,
+)
+from src.outbox import get_outbox
+from src.opensea_stream import OpenSeaStream
+from src.profiling import profiler
+from src.supervisor import CircuitBreaker, sleep_on_error, supervise
+from src.sharding import ShardWorker, is_owned
+from src.checkpoint import Checkpoint, get_checkpoint_store
+from src.dedup import get_dedup_index
+from src.image_cache import fill_missing_image_urls, get_image_cache
+from src.stats import get_stats_engine
+from src.metrics import (
+    EVENTS_DEDUPLICATED,
+    EVENTS_FETCHED,
+    LAST_INGEST,
+    SALE_AGE_AT_POST,
+    SALES_DEAD_LETTERED,
+    SALES_POSTED,
+    start_metrics_server,
+    time_stage,
+)
 from datetime import datetime
-from dotenv import load_dotenv
 
-load_dotenv()
+DISCORD_CHANNEL = "discord"
+TWITTER_CHANNEL = "twitter"
 
 
-def run(sales_bot_type: SalesBotType = SalesBotType.KONG):
-    this_path = os.path.dirname(os.path.abspath(__file__))
-    since_path = os.path.join(this_path, "sales_since", f"{sales_bot_type.value}.json")
+# * per collection, so that a sale that the stream and a poll store at
+# * once is filled in and counted once
+_store_locks: Dict[int, threading.Lock] = {}
 
-    since_index = json.loads(open(since_path).read())["index"]
-    since_block = json.loads(open(since_path).read())["block"]
-    since_timestamp = json.loads(open(since_path).read())["timestamp"]
 
-    def update_since(data: List[SalesDatum]):
-        nonlocal since_index, since_block
+def store_sales(
+    sales_bot_type: SalesBotType, sales_bot: SalesBot, events: List[Dict]
+) -> Tuple[int, int]:
+    """
+    Appends the events that were not ingested yet to the outbox. Returns
+    the number of new sales, and of images filled in.
+    """
 
-        since_index = data[0].transaction_index
-        since_block = data[0].transaction_block
+    collection = sales_bot_type.value
+    dedup_index = get_dedup_index()
 
-        with open(since_path, "w") as f:
-            f.write(
-                json.dumps(
-                    {
-                        "index": since_index,
-                        "block": since_block,
-                        "timestamp": int(time.time()),
-                    }
-                )
-            )
+    with _store_locks.setdefault(collection, threading.Lock()):
+        new_sales = dedup_index.filter_new(collection, events)
+        # * thumbnails the events came without, e.g. unrevealed rookies
+        images_count = fill_missing_image_urls(
+            new_sales, sales_bot.asset_contract_address
+        )
+        # * annotates the sales with the stats as of each of them
+        stats_engine = get_stats_engine()
+        with time_stage("stats_update"):
+            stats_update = stats_engine.record(collection, new_sales)
+        try:
+            with time_stage("outbox_append"):
+                sales_count = get_outbox().append(collection, new_sales)
+            dedup_index.add(collection, new_sales)
+            # * only once the sales are in the outbox, a failed batch is
+            # * retried and must not be counted twice
+            with time_stage("stats_update"):
+                stats_engine.persist(stats_update)
+        except Exception:
+            # * read from SQLite again, without the failed batch
+            stats_engine.evict(collection)
+            raise
+
+    EVENTS_FETCHED.inc(len(events), collection=sales_bot_type.name)
+    EVENTS_DEDUPLICATED.inc(
+        len(events) - len(new_sales), collection=sales_bot_type.name
+    )
 
-    print("Creating sales bot...")
+    return sales_count, images_count
 
-    sales_bot = SalesBot(sales_bot_type)
 
-    print(f"Preparing webhook {sales_bot.discord_webhook}")
+def ingest(sales_bot_type: SalesBotType) -> int:
+    """
+    Appends the sales since the last checkpoint to the outbox. Returns
+    the number of new sales.
+    """
 
-    webhook = discord.Webhook.from_url(
-        sales_bot.discord_webhook, adapter=discord.RequestsWebhookAdapter()
-    )
+    collection = sales_bot_type.value
+    checkpoints = get_checkpoint_store()
+    since = checkpoints.get(collection)
 
-    print("Fetching sales data...")
-    response = requests.request(
-        "GET",
-        OPENSEA_EVENTS_URL
-        + sales_bot.opensea_slug
-        + f"?after={since_timestamp}&event_type=sale",
-        headers={
-            "accept": "application/json",
-            "x-api-key": os.getenv("OPENSEA_API_KEY"),
-        },
+    sales_bot = SalesBot(sales_bot_type)
+
+    print(f"Fetching {sales_bot_type.name} sales data...")
+    # * we need to go from oldest sales to newest ones here. The window
+    # * overlaps the previous one so that no sale falls in a gap, the
+    # * dedup index drops the sales that were already ingested
+    sales_data = iter_sale_events(
+        sales_bot.opensea_slug,
+        since.timestamp - FETCH_OVERLAP,
+        since.block,
+        since.index,
     )
 
-    response_json = response.json()
+    # * each chunk is written in one transaction, and the checkpoint
+    # * only moves once the chunk is safely in the outbox
+    sales_count = 0
+    duplicates_count = 0
+    images_count = 0
+    timestamp = since.timestamp
+    while True:
+        chunk = list(itertools.islice(sales_data, OUTBOX_APPEND_CHUNK_SIZE))
+        if len(chunk) == 0:
+            break
+
+        chunk_sales_count, chunk_images_count = store_sales(
+            sales_bot_type, sales_bot, chunk
+        )
+        sales_count += chunk_sales_count
+        duplicates_count += len(chunk) - chunk_sales_count
+        images_count += chunk_images_count
 
-    # * we need to go from oldest sales to newest ones here
-    sales_data = response_json["asset_events"]
+        # * the checkpoint is the time of the newest sale, not of the fetch
+        for event in chunk:
+            timestamp = max(timestamp, get_event_timestamp(event) or timestamp)
+        block, index = get_event_block_and_index(chunk[-1])
+        checkpoints.advance(collection, Checkpoint(block, index, timestamp))
+    checkpoints.flush(collection)
+    LAST_INGEST.set(time.time(), collection=sales_bot_type.name)
 
+    logging.info(
+        f"{sales_bot_type.name}: dropped {duplicates_count} duplicate sales, "
+        + f"filled in {images_count} missing images"
+    )
     print(
-        f"Found {len(sales_data)} sales since {datetime.utcfromtimestamp(since_timestamp).strftime('%Y-%m-%d %H:%M:%S')}"
+        f"Found {sales_count} new sales since {datetime.utcfromtimestamp(since.timestamp).strftime('%Y-%m-%d %H:%M:%S')}"
+    )
+    logging.info(f"HTTP connections: {http_client.stats()}")
+
+    return sales_count
+
+
+def record_posted(
+    sales_bot_type: SalesBotType,
+    channel: str,
+    data: List[SalesDatum],
+    latencies: List[float],
+) -> None:
+    SALES_POSTED.inc(collection=sales_bot_type.name, channel=channel)
+
+    if data[0].event_timestamp is not None:
+        latency = time.time() - data[0].event_timestamp
+        latencies.append(latency)
+        SALE_AGE_AT_POST.set(latency, collection=sales_bot_type.name, channel=channel)
+
+
+@contextmanager
+def sale_errors(row_id: int) -> Iterator[None]:
+    # * what fails to parse or render is the sale's fault, unless it is
+    # * a network or disk error, e.g. fetching the exchange rates
+    try:
+        yield
+    except (requests.RequestException, OSError):
+        raise
+    except Exception as e:
+        raise SaleError(f"outbox row {row_id}") from e
+
+
+def deliver_discord(
+    sales_bot_type: SalesBotType, owned: Optional[Set[str]] = None
+) -> Tuple[int, List[float]]:
+    """
+    Posts the sales in the outbox that the discord channel has not
+    delivered yet. Returns the number of sales posted and the sale to
+    post latency, in seconds, of each. In worker mode, `owned` is the
+    worker's collections, see `is_owned`.
+    """
+
+    outbox = get_outbox()
+    collection = sales_bot_type.value
+
+    rows = outbox.claim(DISCORD_CHANNEL, collection)
+    if len(rows) == 0:
+        return 0, []
+
+    sales_bot = SalesBot(sales_bot_type)
+    deliveries = get_discord_delivery_queue(sales_bot.discord_webhook).group()
+    is_wanted = functools.partial(is_owned, owned, sales_bot_type)
+
+    sales: List[List[SalesDatum]] = []
+    latencies: List[float] = []
+    sales_done = 0
+
+    # * called from the delivery worker, once a batch is posted
+    def on_delivered(batch: EmbedBatch):
+        nonlocal sales_done
+
+        for data in sales[sales_done : batch.groups_done]:
+            record_posted(sales_bot_type, DISCORD_CHANNEL, data, latencies)
+
+        if batch.groups_done > sales_done:
+            row_id, _ = rows[batch.groups_done - 1]
+            outbox.mark_done(DISCORD_CHANNEL, collection, row_id)
+            sales_done = batch.groups_done
+
+    # * embeds of many sales are packed into as few webhook calls as
+    # * possible. The embeds of a bundle stay together and in order.
+    # * Rendering carries on while earlier batches are being posted
+    packer = EmbedPacker()
+    try:
+        for row_id, sales_datum in rows:
+            with sale_errors(row_id):
+                with time_stage("parse"):
+                    data: List[SalesDatum] = SalesDatum.from_json(
+                        sales_datum, sales_bot.spec
+                    )
+                with time_stage("render_discord"):
+                    embeds = sales_bot.build_discord_messages(data)
+            sales.append(data)
+            for batch in packer.add(embeds):
+                deliveries.put(batch, on_delivered, is_wanted)
+    finally:
+        # * the sales rendered before a failing one still go out, so that
+        # * the failure is counted against the sale that caused it
+        for batch in packer.flush():
+            deliveries.put(batch, on_delivered, is_wanted)
+
+        # * the next claim must start from where this one left off, or
+        # * it would post the batches still in flight again
+        deliveries.wait()
+
+    return len(rows), latencies
+
+
+def deliver_twitter(
+    sales_bot_type: SalesBotType, owned: Optional[Set[str]] = None
+) -> Tuple[int, List[float]]:
+    """
+    Tweets the sales in the outbox that the twitter channel has not
+    delivered yet, one tweet per sale, bundles included. Returns the
+    number of sales tweeted and the sale to tweet latency, in seconds,
+    of each.
+    """
+
+    outbox = get_outbox()
+    collection = sales_bot_type.value
+
+    rows = outbox.claim(TWITTER_CHANNEL, collection)
+    if len(rows) == 0:
+        return 0, []
+
+    sales_bot = SalesBot(sales_bot_type)
+    # * the account's queue is shared, only this collection's tweets are
+    # * waited on
+    deliveries = get_twitter_delivery_queue().group()
+    is_wanted = functools.partial(is_owned, owned, sales_bot_type)
+
+    latencies: List[float] = []
+
+    # * called from the delivery worker, once a tweet is posted
+    def on_delivered(row_id: int, data: List[SalesDatum], _: str):
+        record_posted(sales_bot_type, TWITTER_CHANNEL, data, latencies)
+        outbox.mark_done(TWITTER_CHANNEL, collection, row_id)
+
+    try:
+        for row_id, sales_datum in rows:
+            with sale_errors(row_id):
+                with time_stage("parse"):
+                    data: List[SalesDatum] = SalesDatum.from_json(
+                        sales_datum, sales_bot.spec
+                    )
+                with time_stage("render_twitter"):
+                    status_text = sales_bot.build_twitter_message(data)
+            deliveries.put(
+                status_text, functools.partial(on_delivered, row_id, data), is_wanted
+            )
+    finally:
+        # * the next claim must start from where this one left off, or
+        # * it would post the tweets still in flight again
+        deliveries.wait()
+
+    return len(rows), latencies
+
+
+def record_failed_delivery(
+    sales_bot_type: SalesBotType, channel: str, error: Exception
+) -> None:
+    """
+    Counts a failed delivery against the channel's oldest pending sale,
+    which is where every delivery stops. A sale rejected with a non
+    retryable status, or failing `OUTBOX_MAX_ATTEMPTS` times to parse or
+    render (a `SaleError`), is dead lettered, so that the sales behind it
+    go out. Other errors, e.g. an outage, a revoked webhook or a locked
+    database, are about the bot rather than the sale, and are retried as
+    long as it takes.
+    """
+
+    if is_non_retryable(error):
+        max_attempts = 1
+    elif isinstance(error, SaleError):
+        max_attempts = OUTBOX_MAX_ATTEMPTS
+    else:
+        return
+
+    row_id = get_outbox().record_failure(
+        channel, sales_bot_type.value, repr(error), max_attempts
     )
+    if row_id is not None:
+        SALES_DEAD_LETTERED.inc(collection=sales_bot_type.name, channel=channel)
+        logging.warning(
+            f"{sales_bot_type.name}_{channel}: gave up on outbox row {row_id}: {error!r}"
+        )
+
 
-    for sales_datum in sales_data:
-        data: List[SalesDatum] = SalesDatum.from_json(sales_datum)
+# * delivery channels, each with its own outbox cursor and loop
+CHANNELS: Dict[
+    str, Callable[[SalesBotType, Optional[Set[str]]], Tuple[int, List[float]]]
+] = {
+    DISCORD_CHANNEL: deliver_discord,
+    TWITTER_CHANNEL: deliver_twitter,
+}
 
-        discord_messages = sales_bot.build_discord_messages(data)
-        for msg in discord_messages:
-            webhook.send(embed=msg)
 
-        # ! note that we might send a discord message but not a twitter message
-        # ! the next run, we will send the same discord message again
-        # ! one potential solution is keep re-trying sending a tweet
-        # ! until it succeeds. Note that there is no problem if we fail
-        # ! to send a discord message, we will just retry the whole thing
-        # ! on the next run.
-        update_since(data)
+def get_enabled_channels() -> List[str]:
+    channels = [DISCORD_CHANNEL]
+    if is_twitter_enabled():
+        channels.append(TWITTER_CHANNEL)
+    return channels
 
 
-def main(bot_type: int):
+async def ingest_loop(
+    sales_bot_type: SalesBotType,
+    scheduler: AdaptiveScheduler,
+    new_sales: List[asyncio.Event],
+    poll_now: asyncio.Event,
+):
+    breaker = CircuitBreaker(f"{sales_bot_type.name}_ingest")
     while True:
-        run(SalesBotType.from_int(bot_type))
-        logging.info("Sleeping for 10 minutes...")
-        time.sleep(10 * SLEEP_TIME)
+        # * set while this cycle runs, e.g. by a reconnecting stream, it
+        # * starts the next cycle right away
+        poll_now.clear()
+        try:
+            sales_count = await asyncio.to_thread(
+                profiler.run, f"{sales_bot_type.name}_ingest", ingest, sales_bot_type
+            )
+        except Exception:
+            await sleep_on_error(breaker)
+            continue
+        breaker.record_success()
+
+        if sales_count > 0:
+            for event in new_sales:
+                event.set()
+
+        try:
+            await asyncio.wait_for(
+                poll_now.wait(), scheduler.next_interval(sales_count)
+            )
+        except asyncio.TimeoutError:
+            pass
+
+
+async def stream_loop(
+    sales_bot_type: SalesBotType,
+    new_sales: List[asyncio.Event],
+    poll_now: asyncio.Event,
+):
+    sales_bot = SalesBot(sales_bot_type)
+
+    async def on_sale(event: Dict):
+        sales_count, _ = await asyncio.to_thread(
+            store_sales, sales_bot_type, sales_bot, [event]
+        )
+        if sales_count > 0:
+            for new_sales_event in new_sales:
+                new_sales_event.set()
+
+    # * the stream does not move the checkpoint, so a poll from it
+    # * fetches whatever sold while the stream was down
+    await OpenSeaStream(
+        f"{sales_bot_type.name}_stream",
+        sales_bot.opensea_slug,
+        on_sale,
+        poll_now.set,
+    ).run()
+
+
+async def deliver_loop(
+    sales_bot_type: SalesBotType,
+    channel: str,
+    scheduler: AdaptiveScheduler,
+    new_sales: asyncio.Event,
+    owned: Optional[Set[str]],
+):
+    breaker = CircuitBreaker(f"{sales_bot_type.name}_{channel}")
+    # * the first pass delivers whatever a previous run left in the outbox
+    while True:
+        new_sales.clear()
+        try:
+            sales_count, latencies = await asyncio.to_thread(
+                profiler.run,
+                f"{sales_bot_type.name}_{channel}",
+                CHANNELS[channel],
+                sales_bot_type,
+                owned,
+            )
+        except Exception as error:
+            await asyncio.to_thread(
+                record_failed_delivery, sales_bot_type, channel, error
+            )
+            await sleep_on_error(breaker)
+            continue
+        try:
+            await asyncio.to_thread(
+                get_outbox().prune, sales_bot_type.value, OUTBOX_RETENTION
+            )
+        except Exception:
+            await sleep_on_error(breaker)
+            continue
+        breaker.record_success()
+
+        scheduler.record_latencies(latencies)
+        # * a claim is capped, so keep going while rows are left over
+        if sales_count == 0:
+            await new_sales.wait()
+
+
+async def prefetch_images(sales_bot_type: SalesBotType):
+    sales_bot = SalesBot(sales_bot_type)
+    try:
+        count = await asyncio.to_thread(
+            get_image_cache().prefetch,
+            sales_bot.opensea_slug,
+            sales_bot.asset_contract_address,
+        )
+    except Exception:
+        # * sales still get their images, one lookup at a time
+        handle_exception()
+        logging.warning(f"{sales_bot_type.name}: could not prefetch images")
+        return
+
+    logging.info(f"{sales_bot_type.name}: cached {count} image urls")
+
+
+async def run_collection(
+    sales_bot_type: SalesBotType, owned: Optional[Set[str]] = None
+):
+    # * each collection has its own schedule and checkpoint file, and
+    # * ingestion and delivery run independently via the outbox. The
+    # * blocking work runs in worker threads, so a slow collection or
+    # * channel never holds up the others. They all share the http pool.
+    min_interval, max_interval = SalesBot(sales_bot_type).poll_interval_bounds
+    scheduler = AdaptiveScheduler(sales_bot_type.name, min_interval, max_interval)
+    channels = get_enabled_channels()
+    # * one event per channel, so that each loop wakes up on new sales
+    new_sales = {channel: asyncio.Event() for channel in channels}
+
+    for channel in channels:
+        await asyncio.to_thread(get_outbox().register, channel, sales_bot_type.value)
+
+    poll_now = asyncio.Event()
+
+    loops = [ingest_loop(sales_bot_type, scheduler, list(new_sales.values()), poll_now)]
+    loops += [
+        deliver_loop(sales_bot_type, channel, scheduler, new_sales[channel], owned)
+        for channel in channels
+    ]
+    if OPENSEA_STREAM:
+        # * sales are pushed within seconds, the polls, finding them
+        # * already ingested, back off to the maximum interval
+        loops.append(stream_loop(sales_bot_type, list(new_sales.values()), poll_now))
+    if IMAGE_PREFETCH:
+        # * runs once, alongside the loops
+        loops.append(prefetch_images(sales_bot_type))
+
+    await asyncio.gather(*loops)
+
+
+def readiness(sales_bot_types: List[SalesBotType]) -> Tuple[bool, Dict]:
+    """
+    Ready while every collection has ingested, and every channel has
+    drained its outbox backlog, within the last `READY_MAX_LAG` seconds.
+    """
+
+    now = time.time()
+    is_ready = True
+    collections: Dict[str, Dict] = {}
+
+    for sales_bot_type in sales_bot_types:
+        last_ingest = LAST_INGEST.get(collection=sales_bot_type.name)
+        ingest_lag = None if last_ingest is None else now - last_ingest
+        if ingest_lag is None or ingest_lag > READY_MAX_LAG:
+            is_ready = False
+
+        channels: Dict[str, Dict] = {}
+        for channel in get_enabled_channels():
+            pending, oldest = get_outbox().backlog(channel, sales_bot_type.value)
+            delivery_lag = 0.0 if oldest is None else now - oldest
+            if delivery_lag > READY_MAX_LAG:
+                is_ready = False
+            channels[channel] = {"pending": pending, "lag": delivery_lag}
+
+        collections[sales_bot_type.name] = {
+            "ingest_lag": ingest_lag,
+            "channels": channels,
+        }
+
+    return is_ready, {"collections": collections}
+
+
+def supervise_collection(
+    sales_bot_type: SalesBotType, owned: Optional[Set[str]] = None
+) -> Awaitable[None]:
+    # * a collection that fails outside of its loops, e.g. on an outbox
+    # * error at start up, is restarted in process, without the others.
+    # * `owned` is the worker's collections in worker mode, see `is_owned`
+    return supervise(
+        sales_bot_type.name, functools.partial(run_collection, sales_bot_type, owned)
+    )
+
+
+async def run_collections(sales_bot_types: List[SalesBotType]):
+    if METRICS_PORT > 0:
+        start_metrics_server(
+            METRICS_PORT, functools.partial(readiness, sales_bot_types)
+        )
+
+    await asyncio.gather(*(supervise_collection(t) for t in sales_bot_types))
+
+
+def take_over(sales_bot_type: SalesBotType) -> None:
+    # * another worker may have run the collection since this one last
+    # * did, so what is cached of it is read from SQLite again
+    collection = sales_bot_type.value
+    get_checkpoint_store().evict(collection)
+    get_dedup_index().evict(collection)
+    get_stats_engine().evict(collection)
+
+
+async def run_worker(sales_bot_types: List[SalesBotType]):
+    # * shares the collections with the other workers, see src/sharding.py
+    worker = ShardWorker(sales_bot_types, supervise_collection, take_over)
+    if METRICS_PORT > 0:
+        start_metrics_server(METRICS_PORT, lambda: readiness(worker.owned))
+
+    await worker.run()
+
+
+def parse_profile_cycles(args: List[str]) -> Optional[int]:
+    # * `--profile N` profiles the next N cycles, and is removed from args
+    if "--profile" not in args:
+        return None
+
+    i = args.index("--profile")
+    cycles = int(args[i + 1])
+    del args[i : i + 2]
+    return cycles
+
+
+def parse_worker(args: List[str]) -> bool:
+    # * `--worker` runs a share of the collections, and is removed from args
+    if "--worker" not in args:
+        return False
+
+    args.remove("--worker")
+    return True
+
+
+def parse_bot_types(args: List[str]) -> List[SalesBotType]:
+    # * no argument or "all" runs every collection in this process
+    if len(args) == 0 or args == ["all"]:
+        return list(SalesBotType)
+
+    return [SalesBotType.from_int(int(arg)) for arg in args]
+
+
+def main(bot_types: List[SalesBotType], is_worker: bool = False):
+    asyncio.run(run_worker(bot_types) if is_worker else run_collections(bot_types))
 
 
 if __name__ == "__main__":
     try:
-        bot_kind = int(sys.argv[1])
-
-        suffix = ""
-        if bot_kind == SalesBotType.KONG.value:
-            suffix = "_kongs.log"
-        elif bot_kind == SalesBotType.SNEAKER.value:
-            suffix = "_sneakers.log"
-        elif bot_kind == SalesBotType.ROOKIE.value:
-            suffix = "_rookies.log"
-        else:
-            raise Exception("Invalid bot type")
+        args = sys.argv[1:]
+        profile_cycles = parse_profile_cycles(args)
+        if profile_cycles is not None:
+            profiler.cycles = profile_cycles
+        is_worker = parse_worker(args)
+        bot_types = parse_bot_types(args)
+
+        # * e.g. salesbot_kongs.log for the KONG collection alone
+        suffix = "_all.log"
+        if len(bot_types) == 1:
+            suffix = f"_{bot_types[0].name.lower()}s.log"
 
         logging.basicConfig(
             filename="salesbot" + suffix,
@@ -121,15 +634,19 @@ if __name__ == "__main__":
             datefmt="%Y-%m-%d %H:%M:%S",
         )
 
-        main(int(sys.argv[1]))
+        main(bot_types, is_worker)
     except KeyboardInterrupt:
         logging.info("KeyboardInterrupt caught. Gracefully exiting.")
         sys.exit(0)
     except:
         handle_exception()
 
-        logging.warning("Error occured... Sleeping for 1 hour...")
-        time.sleep(ONE_HOUR_IN_SECONDS)
+        # * failing loops are restarted in process, see src/supervisor.py,
+        # * so this is a failure outside of them, e.g. a bad argument
+        logging.warning(
+            f"Error occured... Exiting in {SUPERVISOR_BACKOFF_MAX} seconds..."
+        )
+        time.sleep(SUPERVISOR_BACKOFF_MAX)
         # re-running on error is handled by the OS
         # there is a file in this dir: `run.sh`
         # that you should run, instead of running
@@ -0,0 +1,256 @@
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import logging
+import json
+import time
+
+# * in seconds, from a cached lookup to a slow paginated fetch
+STAGE_BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# * every metric in the process, in the order they are exposed
+_metrics: List["Metric"] = []
+
+
+def format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if len(pairs) > 0 else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}"
+                for key, value in self._values.items()
+            ]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def get(self, **labels: str) -> Optional[float]:
+        return self._values.get(self._key(labels))
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: str) -> None:
+        self._observe(self._key(labels), value)
+
+    def _observe(self, key: Tuple[str, ...], value: float) -> None:
+        # * per bucket counts, made cumulative when rendered, so an
+        # * observation only touches one of them
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # * one slot per bucket, +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[i] += 1
+            counts[-1] += value
+
+    def time(self, **labels: str) -> "Timer":
+        return Timer(self, self._key(labels))
+
+    def _samples(self) -> List[str]:
+        samples = []
+        with self._lock:
+            items = [(key, list(counts)) for key, counts in self._values.items()]
+
+        for key, counts in items:
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                le = f'le="{format_value(bound)}"'
+                samples.append(
+                    f"{self.name}_bucket{format_labels(self.label_names, key, le)} {total}"
+                )
+            labels = format_labels(self.label_names, key)
+            samples.append(f"{self.name}_sum{labels} {format_value(counts[-1])}")
+            samples.append(f"{self.name}_count{labels} {total}")
+
+        return samples
+
+
+class Timer:
+    """
+    Observes the time spent in a `with` block, in seconds.
+    """
+
+    __slots__ = ("histogram", "key", "started_at")
+
+    def __init__(self, histogram: Histogram, key: Tuple[str, ...]):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self) -> "Timer":
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram._observe(self.key, time.perf_counter() - self.started_at)
+
+
+STAGE_SECONDS = Histogram(
+    "salesbot_stage_seconds",
+    "Time spent in each stage of the fetch, enrich, render, post path.",
+    ["stage"],
+)
+EVENTS_FETCHED = Counter(
+    "salesbot_events_fetched_total",
+    "Sale events fetched from OpenSea, duplicates included.",
+    ["collection"],
+)
+EVENTS_DEDUPLICATED = Counter(
+    "salesbot_events_deduplicated_total",
+    "Sale events dropped because they were already ingested.",
+    ["collection"],
+)
+SALES_DEAD_LETTERED = Counter(
+    "salesbot_sales_dead_lettered_total",
+    "Sales given up on after failing to render or post, per channel.",
+    ["collection", "channel"],
+)
+SALES_POSTED = Counter(
+    "salesbot_sales_posted_total",
+    "Sales delivered, per channel.",
+    ["collection", "channel"],
+)
+SALE_AGE_AT_POST = Gauge(
+    "salesbot_sale_age_at_post_seconds",
+    "Time from the sale to its post, for the last sale posted.",
+    ["collection", "channel"],
+)
+LAST_INGEST = Gauge(
+    "salesbot_last_ingest_timestamp_seconds",
+    "When the last ingestion cycle finished.",
+    ["collection"],
+)
+
+
+def time_stage(stage: str) -> Timer:
+    return STAGE_SECONDS.time(stage=stage)
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in _metrics) + "\n"
+
+
+# * returns whether the bot is ready, and details to show
+ReadinessCheck = Callable[[], Tuple[bool, Dict]]
+
+
+def start_metrics_server(
+    port: int, readiness: ReadinessCheck, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """
+    Serves `/metrics` in the Prometheus text format and `/ready`, which
+    answers 200 or 503 with the details of `readiness`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status: int, body: str, content_type: str):
+            payload = body.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            try:
+                if self.path == "/metrics":
+                    return self.reply(
+                        200, render_metrics(), "text/plain; version=0.0.4"
+                    )
+                if self.path == "/ready":
+                    is_ready, details = readiness()
+                    return self.reply(
+                        200 if is_ready else 503,
+                        json.dumps({"ready": is_ready, **details}),
+                        "application/json",
+                    )
+                self.reply(404, "not found\n", "text/plain")
+            except Exception:
+                logging.exception("")
+                self.reply(500, "error\n", "text/plain")
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving metrics on port {port}")
+
+    return server
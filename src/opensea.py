@@ -1,14 +1,26 @@
 from __future__ import annotations
-from typing import Dict, List, Optional, TYPE_CHECKING
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 from enum import Enum
 from dataclasses import dataclass
+from datetime import datetime, timezone
+import tempfile
 import logging
+import json
 
-from src.collections.kongs import get_kong_boosts
+from src.collections.kongs import get_kong_boost_ranks, get_kong_boosts
+from src.consts import OPENSEA_API_KEY, OPENSEA_EVENTS_URL, OPENSEA_EVENTS_PAGE_SIZE
+from src.http_client import http_client
+from src.metrics import time_stage
 from src.util import get_usd_price
 
 if TYPE_CHECKING:
-    from src.collections.kongs import Boosts
+    from src.collections.kongs import BoostRanks, Boosts
+    from src.collections.renderer import CollectionSpec
+    from src.stats import LastSale, SaleStats
+
+# * the keys src/stats.py annotates ingested sales with
+STATS_KEY = "salesbot_stats"
+LAST_SALES_KEY = "salesbot_last_sales"
 
 
 class TradeSide(Enum):
@@ -16,14 +28,36 @@ class TradeSide(Enum):
     Seller = 1
 
 
-@dataclass(frozen=True)
-class SalesDatum:
+@dataclass
+class SaleHeader:
+    """
+    The part of a sale that all the assets of a bundle have in common.
+    Shared by the `SalesDatum` of every asset, rather than copied into
+    each. Prices are derived on first use and then cached.
+    """
+
+    __slots__ = (
+        "bundle_name",
+        "bundle_link",
+        "total_price",
+        "buyer",
+        "seller",
+        "buyer_address",
+        "seller_address",
+        "payment_symbol",
+        "payment_decimals",
+        "payment_usd",
+        "transaction_index",
+        "transaction_block",
+        "event_timestamp",
+        "stats",
+        "_price_eth",
+        "_price_usd",
+    )
+
     bundle_name: Optional[str]
     bundle_link: Optional[str]
 
-    asset_name: str
-    image_url: str
-    token_id: int
     total_price: float
 
     buyer: str
@@ -34,18 +68,75 @@ class SalesDatum:
 
     payment_symbol: str
     payment_decimals: int
-    payment_usd: float
+    payment_usd: Optional[float]
 
     # * we require these two to know which
     # * trades to publish to discord and twitter
-    transaction_index: int
-    transaction_block: int
+    transaction_index: Optional[int]
+    transaction_block: Optional[int]
+
+    # * unix timestamp of the sale, used to measure sale to post latency
+    event_timestamp: Optional[int]
+
+    # * the collection's rolling stats as of the sale, see src/stats.py
+    stats: Optional[SaleStats]
+
+    def __post_init__(self):
+        self._price_eth: Optional[float] = None
+        self._price_usd: Optional[float] = None
+
+    def price_eth(self) -> float:
+        if self._price_eth is None:
+            self._price_eth = float(self.total_price) / (10**self.payment_decimals)
+        return self._price_eth
+
+    def price_usd(self) -> float:
+        if self._price_usd is None:
+            self._price_usd = self.price_eth() * float(self.payment_usd)
+        return self._price_usd
+
+
+@dataclass(frozen=True)
+class SalesDatum:
+    __slots__ = (
+        "header",
+        "asset_name",
+        "image_url",
+        "token_id",
+        "boosts",
+        "boost_ranks",
+        "last_sale",
+    )
+
+    header: SaleHeader
+
+    asset_name: str
+    image_url: str
+    token_id: int
 
     boosts: Optional[Boosts]
+    boost_ranks: Optional[BoostRanks]
+
+    # * the token's previous sale, see src/stats.py
+    last_sale: Optional[LastSale]
+
+    # * frozen dataclasses with __slots__ cannot be unpickled, the default
+    # * `__setstate__` assigns through the frozen `__setattr__`.
+    # * `dataclass(slots=True)` would handle it, but needs python 3.10
+    def __getstate__(self) -> Tuple:
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state: Tuple) -> None:
+        for slot, value in zip(self.__slots__, state):
+            object.__setattr__(self, slot, value)
 
     # TODO: this is pretty poo. Refactor.
     @classmethod
-    def from_json(cls, data: Dict) -> List["SalesDatum"]:
+    def from_json(
+        cls, data: Dict, spec: CollectionSpec, with_usd_price: bool = True
+    ) -> List["SalesDatum"]:
+        # * without the usd price, e.g. for the archive, the payment token
+        # * needs no exchange rate and `payment_usd` is None
         is_bundle = data.get("asset_bundle", None) is not None
 
         if not is_bundle:
@@ -54,15 +145,7 @@ class SalesDatum:
             token_id = data["nft"]["identifier"]
             total_price = data["payment"]["quantity"]
 
-            # rationale for this is that kongs can have any name
-            # so it is easier to check that event is not about
-            # sneakers
-            boosts: Optional[Boosts] = None
-            if asset_name is not None:
-                is_sneaks = asset_name.startswith("RKL Sneakers")
-                is_rooks = asset_name.startswith("Rookie")
-                if not is_sneaks and not is_rooks:
-                    boosts = get_kong_boosts(token_id)
+            boosts, boost_ranks = get_boosts(spec, token_id)
 
             buyer = data["buyer"]
             seller = data["seller"]
@@ -70,26 +153,35 @@ class SalesDatum:
             payment_symbol = data["payment"]["symbol"]
             payment_decimals = data["payment"]["decimals"]
 
-            payment_usd = get_usd_price(payment_symbol)
-
+            payment_usd = get_usd_price(payment_symbol) if with_usd_price else None
+
+            header = SaleHeader(
+                None,
+                None,
+                total_price,
+                buyer,
+                seller,
+                buyer,
+                seller,
+                payment_symbol,
+                payment_decimals,
+                payment_usd,
+                None,
+                None,
+                get_event_timestamp(data),
+                data.get(STATS_KEY),
+            )
+
+            last_sales = data.get(LAST_SALES_KEY) or {}
             return [
                 cls(
-                    None,
-                    None,
+                    header,
                     asset_name,
                     image_url,
                     token_id,
-                    total_price,
-                    buyer,
-                    seller,
-                    buyer,
-                    seller,
-                    payment_symbol,
-                    payment_decimals,
-                    payment_usd,
-                    None,
-                    None,
                     boosts,
+                    boost_ranks,
+                    last_sales.get(str(token_id)),
                 )
             ]
         # bundle
@@ -97,24 +189,9 @@ class SalesDatum:
             # TODO: not DRY
             bundle_name = data["asset_bundle"]["name"]
             bundle_link = data["asset_bundle"]["permalink"]
-
-            asset_names = [asset["name"] for asset in data["asset_bundle"]["assets"]]
-            image_urls = [
-                asset["image_url"] for asset in data["asset_bundle"]["assets"]
-            ]
-            token_ids = [asset["token_id"] for asset in data["asset_bundle"]["assets"]]
+            assets = data["asset_bundle"]["assets"]
             total_price = data["total_price"]
 
-            # rationale for this is that kongs can have any name
-            # so it is easier to check that event is not about
-            # sneakers
-            first_asset_name = data["asset_bundle"]["assets"][0]["name"]
-            boosts_bundle: List[Boosts] = []
-            is_sneakers = first_asset_name.startswith("RKL Sneakers")
-            if not is_sneakers:
-                for asset in data["asset_bundle"]["assets"]:
-                    boosts_bundle.append(get_kong_boosts(asset["token_id"]))
-
             buyer = get_trade_counter_party(TradeSide.Buyer, data)
             seller = get_trade_counter_party(TradeSide.Seller, data)
 
@@ -128,42 +205,63 @@ class SalesDatum:
 
             payment_symbol = data["payment_token"]["symbol"]
             payment_decimals = data["payment_token"]["decimals"]
-            payment_usd = data["payment_token"]["usd_price"]
+            payment_usd = data["payment_token"]["usd_price"] if with_usd_price else None
 
             transaction_index = int(data["transaction"]["transaction_index"])
             transaction_block = int(data["transaction"]["block_number"])
 
-            items = []
-
-            for i in range(len(asset_names)):
-                items.append(
-                    cls(
-                        bundle_name,
-                        bundle_link,
-                        asset_names[i],
-                        image_urls[i],
-                        token_ids[i],
-                        total_price,
-                        buyer,
-                        seller,
-                        buyer_address,
-                        seller_address,
-                        payment_symbol,
-                        payment_decimals,
-                        payment_usd,
-                        transaction_index,
-                        transaction_block,
-                        None if is_sneakers else boosts_bundle[i],
-                    )
+            # * one header for the whole bundle, every item points to it
+            header = SaleHeader(
+                bundle_name,
+                bundle_link,
+                total_price,
+                buyer,
+                seller,
+                buyer_address,
+                seller_address,
+                payment_symbol,
+                payment_decimals,
+                payment_usd,
+                transaction_index,
+                transaction_block,
+                get_event_timestamp(data),
+                data.get(STATS_KEY),
+            )
+
+            last_sales = data.get(LAST_SALES_KEY) or {}
+            return [
+                cls(
+                    header,
+                    asset["name"],
+                    asset["image_url"],
+                    asset["token_id"],
+                    *get_boosts(spec, asset["token_id"]),
+                    last_sales.get(str(asset["token_id"])),
                 )
+                for asset in assets
+            ]
 
-            return items
+    # * the sale wide fields read through to the shared header
+    bundle_name = property(lambda self: self.header.bundle_name)
+    bundle_link = property(lambda self: self.header.bundle_link)
+    total_price = property(lambda self: self.header.total_price)
+    buyer = property(lambda self: self.header.buyer)
+    seller = property(lambda self: self.header.seller)
+    buyer_address = property(lambda self: self.header.buyer_address)
+    seller_address = property(lambda self: self.header.seller_address)
+    payment_symbol = property(lambda self: self.header.payment_symbol)
+    payment_decimals = property(lambda self: self.header.payment_decimals)
+    payment_usd = property(lambda self: self.header.payment_usd)
+    transaction_index = property(lambda self: self.header.transaction_index)
+    transaction_block = property(lambda self: self.header.transaction_block)
+    event_timestamp = property(lambda self: self.header.event_timestamp)
+    stats = property(lambda self: self.header.stats)
 
     def price_eth(self) -> float:
-        return float(self.total_price) / (10**self.payment_decimals)
+        return self.header.price_eth()
 
     def price_usd(self) -> float:
-        return self.price_eth() * float(self.payment_usd)
+        return self.header.price_usd()
 
 
 def get_trade_counter_party(side: TradeSide, sales_datum: Dict) -> str:
@@ -183,3 +281,159 @@ def get_trade_counter_party(side: TradeSide, sales_datum: Dict) -> str:
         logging.warning(f"Unknown trade side: {side}")
 
     return trade_counter_party
+
+
+def get_boosts(
+    spec: CollectionSpec, token_id: int
+) -> Tuple[Optional[Boosts], Optional[BoostRanks]]:
+    # * by the collection rather than the asset name, kongs can have any name
+    if not spec.has_boosts:
+        return None, None
+    with time_stage("boosts_lookup"):
+        return get_kong_boosts(token_id), get_kong_boost_ranks(token_id)
+
+
+def get_event_block_and_index(event: Dict) -> Tuple[Optional[int], Optional[int]]:
+    # * only bundle (v1 shaped) events carry the block and transaction index,
+    # * v2 events just have the transaction hash under "transaction"
+    transaction = event.get("transaction")
+    if not isinstance(transaction, dict):
+        return None, None
+
+    return int(transaction["block_number"]), int(transaction["transaction_index"])
+
+
+def get_event_timestamp(event: Dict) -> Optional[int]:
+    # * v2 events have a unix "closing_date", v1 ones an iso "event_timestamp"
+    if event.get("closing_date") is not None:
+        return int(event["closing_date"])
+
+    if event.get("event_timestamp") is not None:
+        return int(
+            datetime.fromisoformat(event["event_timestamp"])
+            .replace(tzinfo=timezone.utc)
+            .timestamp()
+        )
+
+    return None
+
+
+def get_event_price(event: Dict) -> Tuple[float, str]:
+    """
+    Total price of the sale, in its payment token, and the token symbol.
+    """
+
+    # * bundle (v1 shaped) events have a "payment_token", v2 ones a "payment"
+    if event.get("asset_bundle") is not None:
+        payment_token = event["payment_token"]
+        quantity = event["total_price"]
+    else:
+        payment_token = event["payment"]
+        quantity = payment_token["quantity"]
+
+    return (
+        float(quantity) / (10 ** payment_token["decimals"]),
+        payment_token["symbol"],
+    )
+
+
+def get_event_token_ids(event: Dict) -> List[str]:
+    if event.get("asset_bundle") is not None:
+        return [str(asset["token_id"]) for asset in event["asset_bundle"]["assets"]]
+    return [str(event["nft"]["identifier"])]
+
+
+def get_event_key(event: Dict) -> str:
+    """
+    Identifies a sale across overlapping fetches: block, transaction
+    index and transaction hash, plus the token, since a sweep sells many
+    tokens in one transaction.
+    """
+
+    block, index = get_event_block_and_index(event)
+
+    transaction = event.get("transaction")
+    if isinstance(transaction, dict):
+        transaction = transaction.get("transaction_hash")
+
+    nft = event.get("nft") or {}
+
+    return f"{block}:{index}:{transaction}:{nft.get('identifier')}"
+
+
+def is_at_or_before_checkpoint(
+    event: Dict, since_block: Optional[int], since_index: Optional[int]
+) -> bool:
+    block, index = get_event_block_and_index(event)
+    if block is None or since_block is None:
+        # * can't tell, the `after` query parameter bounds the window instead
+        return False
+
+    return block < since_block or (block == since_block and index <= since_index)
+
+
+def fetch_sale_events_page(opensea_slug: str, params: Dict) -> Dict:
+    """
+    One page of the collection's sale events, newest first, with the
+    `next` cursor of the following page.
+    """
+
+    url = OPENSEA_EVENTS_URL + opensea_slug
+    headers = {"accept": "application/json", "x-api-key": OPENSEA_API_KEY}
+
+    with time_stage("opensea_fetch"):
+        response = http_client.get(
+            url, params={"event_type": "sale", **params}, headers=headers
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+def iter_sale_events(
+    opensea_slug: str,
+    since_timestamp: int,
+    since_block: Optional[int] = None,
+    since_index: Optional[int] = None,
+) -> Iterator[Dict]:
+    """
+    Follows the `next` cursor of the events endpoint and yields the sales
+    after the checkpoint, oldest first.
+
+    OpenSea serves newest first, so pages are spooled to a temporary file
+    as they arrive, one line per page, and read back in reverse. Only one
+    page is ever held in memory, however many pages a catch-up spans.
+    """
+
+    params = {"after": since_timestamp, "limit": OPENSEA_EVENTS_PAGE_SIZE}
+
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as spool:
+        page_offsets: List[int] = []
+        pages_fetched = 0
+
+        while True:
+            response_json = fetch_sale_events_page(opensea_slug, params)
+            pages_fetched += 1
+
+            page = []
+            reached_checkpoint = False
+            for event in response_json.get("asset_events", []):
+                if is_at_or_before_checkpoint(event, since_block, since_index):
+                    reached_checkpoint = True
+                    break
+                page.append(event)
+
+            if len(page) > 0:
+                page_offsets.append(spool.tell())
+                spool.write(json.dumps(page) + "\n")
+
+            cursor = response_json.get("next")
+            if reached_checkpoint or not cursor:
+                break
+            params["next"] = cursor
+
+        logging.info(f"Fetched {pages_fetched} page(s) of {opensea_slug} sales")
+
+        for offset in reversed(page_offsets):
+            spool.seek(offset)
+            page = json.loads(spool.readline())
+            yield from reversed(page)
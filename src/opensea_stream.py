@@ -0,0 +1,186 @@
+from __future__ import annotations
+from typing import Awaitable, Callable, Dict, Optional
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+import itertools
+import asyncio
+import logging
+import json
+
+from src.consts import (
+    OPENSEA_API_KEY,
+    OPENSEA_STREAM_URL,
+    STREAM_HEARTBEAT_INTERVAL,
+)
+from src.metrics import Gauge
+from src.supervisor import CircuitBreaker, sleep_on_error
+
+STREAM_CONNECTED = Gauge(
+    "salesbot_stream_connected",
+    "1 while the collection is subscribed to OpenSea's Stream API.",
+    ["collection"],
+)
+
+
+def parse_stream_timestamp(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    # * iso, in utc, sometimes with a "Z" that python < 3.11 can't parse
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def stream_event_to_sale_event(payload: Dict) -> Dict:
+    """
+    Converts the payload of an `item_sold` stream event to the shape of
+    a sale of the events API, so that it goes through the same pipeline,
+    and is recognised as the same sale by the dedup index when a poll
+    fetches it too.
+    """
+
+    item = payload["item"]
+    # * "{chain}/{contract}/{token id}"
+    chain, contract, identifier = item["nft_id"].split("/")
+    metadata = item.get("metadata") or {}
+    payment_token = payload["payment_token"]
+    transaction = payload.get("transaction") or {}
+
+    return {
+        "event_type": "sale",
+        "order_hash": payload.get("order_hash"),
+        "chain": chain,
+        "closing_date": parse_stream_timestamp(
+            payload.get("closing_date") or payload.get("event_timestamp")
+        ),
+        "transaction": transaction.get("hash"),
+        "nft": {
+            "identifier": identifier,
+            "contract": contract,
+            "name": metadata.get("name"),
+            "image_url": metadata.get("image_url"),
+        },
+        "payment": {
+            "quantity": payload["sale_price"],
+            "symbol": payment_token["symbol"],
+            "decimals": payment_token["decimals"],
+        },
+        "buyer": payload["taker"]["address"],
+        "seller": payload["maker"]["address"],
+        "quantity": payload.get("quantity", 1),
+    }
+
+
+class StreamClosed(Exception):
+    pass
+
+
+class OpenSeaStream:
+    """
+    Subscribes to the `item_sold` events of one collection on OpenSea's
+    Stream API, a Phoenix channels websocket, and hands every sale to
+    `on_sale`, converted by `stream_event_to_sale_event`.
+
+    The stream reconnects after a jittered backoff, see
+    src/supervisor.py. Sales made while it is down are never replayed,
+    so `on_connected` is called after every join, for the caller to
+    fetch what it missed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        opensea_slug: str,
+        on_sale: Callable[[Dict], Awaitable[None]],
+        on_connected: Callable[[], None],
+        url: str = OPENSEA_STREAM_URL,
+        api_key: Optional[str] = OPENSEA_API_KEY,
+        heartbeat_interval: float = STREAM_HEARTBEAT_INTERVAL,
+    ):
+        self.name = name
+        self.topic = f"collection:{opensea_slug}"
+        self.on_sale = on_sale
+        self.on_connected = on_connected
+        self.url = url
+        self.api_key = api_key
+        self.heartbeat_interval = heartbeat_interval
+
+        self.is_connected = False
+        self._refs = itertools.count(1)
+
+    def _message(self, topic: str, event: str) -> str:
+        return json.dumps(
+            {"topic": topic, "event": event, "payload": {}, "ref": next(self._refs)}
+        )
+
+    async def _heartbeat(self, ws) -> None:
+        # * phoenix drops sockets that stay silent for a minute
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await ws.send_str(self._message("phoenix", "heartbeat"))
+
+    async def _join(self, ws) -> None:
+        await ws.send_str(self._message(self.topic, "phx_join"))
+
+        while True:
+            message = await self._receive(ws)
+            if message["topic"] == self.topic and message["event"] == "phx_reply":
+                status = message["payload"].get("status")
+                if status != "ok":
+                    raise StreamClosed(f"could not join {self.topic}: {message}")
+                return
+
+    async def _receive(self, ws) -> Dict:
+        import aiohttp
+
+        message = await ws.receive()
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise StreamClosed(f"stream closed: {message.type.name}")
+        return json.loads(message.data)
+
+    async def _listen(self) -> None:
+        # * deferred, aiohttp is only needed by the stream
+        import aiohttp
+
+        async with aiohttp.ClientSession() as session:
+            url = f"{self.url}?{urlencode({'token': self.api_key or ''})}"
+            async with session.ws_connect(url) as ws:
+                await self._join(ws)
+
+                self.is_connected = True
+                STREAM_CONNECTED.set(1, collection=self.name)
+                logging.info(f"{self.name}: subscribed to {self.topic}")
+                self.on_connected()
+
+                heartbeat = asyncio.ensure_future(self._heartbeat(ws))
+                try:
+                    while True:
+                        message = await self._receive(ws)
+                        if message["event"] in ("phx_error", "phx_close"):
+                            raise StreamClosed(f"{self.topic}: {message['event']}")
+                        if message["event"] != "item_sold":
+                            continue
+
+                        await self.on_sale(
+                            stream_event_to_sale_event(message["payload"]["payload"])
+                        )
+                finally:
+                    heartbeat.cancel()
+
+    async def run(self) -> None:
+        breaker = CircuitBreaker(self.name)
+        while True:
+            try:
+                # * only returns by raising, a clean close included
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # * a stream that was up starts over from the shortest backoff
+                if self.is_connected:
+                    breaker.record_success()
+                self.is_connected = False
+                STREAM_CONNECTED.set(0, collection=self.name)
+
+                await sleep_on_error(breaker)
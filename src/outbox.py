@@ -0,0 +1,249 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import threading
+import sqlite3
+import json
+import time
+
+from src.consts import OUTBOX_PATH
+from src.opensea import get_event_key
+
+
+class Outbox:
+    """
+    Durable queue of fetched sales, shared by every delivery channel.
+
+    Ingestion appends raw events once. Each (channel, collection) pair
+    keeps its own cursor: the id of the last row it delivered. A channel
+    claims the rows after its cursor and moves the cursor once they are
+    sent, so after a crash delivery resumes from the outbox, and a slow
+    channel only falls behind, without holding up ingestion or the
+    other channels.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sales (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    collection INTEGER NOT NULL,
+                    event_key TEXT NOT NULL,
+                    event TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (collection, event_key)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cursors (
+                    channel TEXT NOT NULL,
+                    collection INTEGER NOT NULL,
+                    last_id INTEGER NOT NULL,
+                    PRIMARY KEY (channel, collection)
+                )
+                """
+            )
+            # * failed deliveries of each channel's oldest pending row,
+            # * kept once dead lettered, for as long as delivered rows
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS delivery_failures (
+                    channel TEXT NOT NULL,
+                    collection INTEGER NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    error TEXT NOT NULL,
+                    failed_at REAL NOT NULL,
+                    dead INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (channel, collection, row_id)
+                )
+                """
+            )
+
+    def register(self, channel: str, collection: int) -> None:
+        """
+        A channel seen for the first time starts from the newest row,
+        rather than replaying everything ever ingested.
+        """
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR IGNORE INTO cursors (channel, collection, last_id)
+                SELECT ?, ?, COALESCE(MAX(id), 0) FROM sales WHERE collection = ?
+                """,
+                (channel, collection, collection),
+            )
+
+    def append(self, collection: int, events: Iterable[Dict]) -> int:
+        """
+        Appends events, oldest first, in one transaction. Events already
+        in the outbox are ignored. Returns the number of new rows.
+        """
+
+        now = time.time()
+        rows = [
+            (collection, get_event_key(event), json.dumps(event), now)
+            for event in events
+        ]
+
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO sales (collection, event_key, event, created_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def claim(
+        self, channel: str, collection: int, limit: int = 100
+    ) -> List[Tuple[int, Dict]]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT id, event FROM sales
+                WHERE collection = ? AND id > (
+                    SELECT last_id FROM cursors WHERE channel = ? AND collection = ?
+                )
+                ORDER BY id
+                LIMIT ?
+                """,
+                (collection, channel, collection, limit),
+            ).fetchall()
+
+        return [(row_id, json.loads(event)) for row_id, event in rows]
+
+    def backlog(self, channel: str, collection: int) -> Tuple[int, Optional[float]]:
+        """
+        Rows the channel has yet to deliver, and when the oldest of them
+        was ingested.
+        """
+
+        with self._lock:
+            return self._conn.execute(
+                """
+                SELECT COUNT(*), MIN(created_at) FROM sales
+                WHERE collection = ? AND id > (
+                    SELECT last_id FROM cursors WHERE channel = ? AND collection = ?
+                )
+                """,
+                (collection, channel, collection),
+            ).fetchone()
+
+    def mark_done(self, channel: str, collection: int, last_id: int) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                UPDATE cursors SET last_id = MAX(last_id, ?)
+                WHERE channel = ? AND collection = ?
+                """,
+                (last_id, channel, collection),
+            )
+
+    def record_failure(
+        self, channel: str, collection: int, error: str, max_attempts: int
+    ) -> Optional[int]:
+        """
+        Counts a failed delivery against the channel's oldest pending row,
+        the one a claim returns first. After `max_attempts` failures the
+        row is dead lettered: the cursor moves past it, in the same
+        transaction. Returns its id if it was.
+        """
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                """
+                SELECT id FROM sales
+                WHERE collection = ? AND id > (
+                    SELECT last_id FROM cursors WHERE channel = ? AND collection = ?
+                )
+                ORDER BY id
+                LIMIT 1
+                """,
+                (collection, channel, collection),
+            ).fetchone()
+            if row is None:
+                return None
+
+            row_id = row[0]
+            self._conn.execute(
+                """
+                INSERT INTO delivery_failures
+                (channel, collection, row_id, attempts, error, failed_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT (channel, collection, row_id) DO UPDATE SET
+                    attempts = attempts + 1,
+                    error = excluded.error,
+                    failed_at = excluded.failed_at
+                """,
+                (channel, collection, row_id, error, time.time()),
+            )
+            (attempts,) = self._conn.execute(
+                """
+                SELECT attempts FROM delivery_failures
+                WHERE channel = ? AND collection = ? AND row_id = ?
+                """,
+                (channel, collection, row_id),
+            ).fetchone()
+            if attempts < max_attempts:
+                return None
+
+            self._conn.execute(
+                """
+                UPDATE delivery_failures SET dead = 1
+                WHERE channel = ? AND collection = ? AND row_id = ?
+                """,
+                (channel, collection, row_id),
+            )
+            self._conn.execute(
+                """
+                UPDATE cursors SET last_id = MAX(last_id, ?)
+                WHERE channel = ? AND collection = ?
+                """,
+                (row_id, channel, collection),
+            )
+            return row_id
+
+    def prune(self, collection: int, older_than: float) -> int:
+        """
+        Deletes rows older than `older_than` seconds that every channel
+        has delivered.
+        """
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM delivery_failures WHERE collection = ? AND failed_at < ?",
+                (collection, time.time() - older_than),
+            )
+            return self._conn.execute(
+                """
+                DELETE FROM sales
+                WHERE collection = ? AND created_at < ? AND id <= (
+                    SELECT COALESCE(MIN(last_id), 0) FROM cursors WHERE collection = ?
+                )
+                """,
+                (collection, time.time() - older_than, collection),
+            ).rowcount
+
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox() -> Outbox:
+    # * opened on first use, and then shared by every collection
+    global _outbox
+
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+        return _outbox
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from typing import Callable, Dict, Optional
+import threading
+import logging
+import time
+
+from src.http_client import http_client
+from src.metrics import time_stage
+from src.consts import (
+    COINBASE_EXCHANGE_RATES_URL,
+    PRICE_ORACLE_TTL,
+    PRICE_ORACLE_MAX_STALENESS,
+)
+
+# * OpenSea reports wrapped tokens under their own symbol, Coinbase does not
+SYMBOL_ALIASES = {"WETH": "ETH"}
+
+
+def fetch_exchange_rates() -> Dict[str, float]:
+    resp = http_client.get(COINBASE_EXCHANGE_RATES_URL)
+    resp.raise_for_status()
+    return {
+        symbol: float(rate) for symbol, rate in resp.json()["data"]["rates"].items()
+    }
+
+
+class PriceOracle:
+    """
+    Serves USD prices from one in-memory copy of Coinbase's exchange-rate
+    table. Once the table is older than `ttl` seconds it is still served
+    while a background refresh runs; past `max_staleness` seconds callers
+    wait for a fresh table instead.
+
+    Only one fetch runs at a time. Callers that waited on another's fetch
+    get its outcome, e.g. on a cold cache, rather than fetching again.
+    """
+
+    def __init__(
+        self,
+        ttl: float = PRICE_ORACLE_TTL,
+        max_staleness: float = PRICE_ORACLE_MAX_STALENESS,
+        fetch: Callable[[], Dict[str, float]] = fetch_exchange_rates,
+    ):
+        self.ttl = ttl
+        self.max_staleness = max_staleness
+        self._fetch = fetch
+
+        self._rates: Optional[Dict[str, float]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+        # * held for the whole fetch, `_lock` only for reads and writes
+        self._fetch_lock = threading.Lock()
+        # * fetches done so far, and the error of the last one if it failed
+        self._fetches = 0
+        self._fetch_error: Optional[Exception] = None
+
+    def refresh(self) -> Dict[str, float]:
+        with self._fetch_lock:
+            return self._refresh()
+
+    def _refresh(self) -> Dict[str, float]:
+        try:
+            with time_stage("exchange_rates_fetch"):
+                rates = self._fetch()
+        except Exception as e:
+            with self._lock:
+                self._fetches += 1
+                self._fetch_error = e
+            raise
+
+        with self._lock:
+            self._rates = rates
+            self._fetched_at = time.monotonic()
+            self._fetches += 1
+            self._fetch_error = None
+        return rates
+
+    def _refresh_in_background(self) -> None:
+        try:
+            self.refresh()
+        except Exception:
+            logging.warning("Could not refresh exchange rates, serving stale ones.")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def rates(self) -> Dict[str, float]:
+        with self._lock:
+            rates = self._rates
+            age = time.monotonic() - self._fetched_at
+
+            if rates is not None and age <= self.ttl:
+                return rates
+
+            if rates is not None and age <= self.max_staleness:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh_in_background, daemon=True
+                    ).start()
+                return rates
+
+            fetches = self._fetches
+
+        with self._fetch_lock:
+            with self._lock:
+                rates = self._rates
+                age = time.monotonic() - self._fetched_at
+                # * another caller fetched while this one waited
+                waited_on = self._fetches != fetches
+                error = self._fetch_error
+
+            try:
+                if not waited_on:
+                    return self._refresh()
+                if error is None:
+                    return rates
+                raise error
+            except Exception:
+                if rates is None:
+                    raise
+                logging.warning(f"Exchange rates are {age:.0f}s old, refresh failed.")
+                return rates
+
+    def get_usd_price(self, symbol: str) -> float:
+        symbol = SYMBOL_ALIASES.get(symbol, symbol)
+        return 1 / self.rates()[symbol]
+
+
+# * shared by every caller in the process, so that a cycle fetches
+# * the rate table once rather than once per sale
+price_oracle = PriceOracle()
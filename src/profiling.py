@@ -0,0 +1,136 @@
+from __future__ import annotations
+from typing import Callable, Optional, TypeVar
+from datetime import datetime
+import threading
+import tracemalloc
+import cProfile
+import logging
+import random
+import time
+import os
+
+from src.consts import (
+    PROFILE_CYCLES,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_MODE,
+    PROFILE_DIR,
+    PROFILE_TOP_ALLOCATIONS,
+)
+
+T = TypeVar("T")
+
+PROFILE_MODES = ("cpu", "memory", "both")
+
+
+class CycleProfiler:
+    """
+    Opt-in profiling of ingestion and delivery cycles. The next `cycles`
+    cycles are profiled, and after that a `sample_rate` share of them,
+    picked at random. Each profiled cycle writes, into `directory`:
+
+        salesbot_{name}_{timestamp}.prof        cProfile stats ("cpu")
+        salesbot_{name}_{timestamp}.allocs.txt  top allocations ("memory")
+
+    Read the .prof files with `python -m pstats` or snakeviz. Only one
+    cycle is profiled at a time, since tracemalloc is process wide, and
+    the posts themselves run on the delivery workers, outside of it.
+    """
+
+    def __init__(
+        self,
+        cycles: int = 0,
+        sample_rate: float = 0.0,
+        mode: str = "cpu",
+        directory: str = ".",
+        top_allocations: int = 25,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode}")
+
+        self.cycles = cycles
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.directory = directory
+        self.top_allocations = top_allocations
+
+        self._busy = threading.Lock()
+
+    def _should_profile(self) -> bool:
+        if self.cycles > 0:
+            self.cycles -= 1
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, name: str, fn: Callable[..., T], *args) -> T:
+        # * cycles that overlap a profiled one run as usual, and don't use
+        # * up the cycles left to profile
+        if not self._busy.acquire(blocking=False):
+            return fn(*args)
+        try:
+            if self._should_profile():
+                return self._profile(name, fn, *args)
+        finally:
+            self._busy.release()
+        return fn(*args)
+
+    def _profile(self, name: str, fn: Callable[..., T], *args) -> T:
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(self.directory, f"salesbot_{name}_{stamp}")
+
+        profile: Optional[cProfile.Profile] = None
+        if self.mode in ("cpu", "both"):
+            profile = cProfile.Profile()
+
+        track_memory = self.mode in ("memory", "both")
+        if track_memory:
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+
+        started_at = time.perf_counter()
+        try:
+            if profile is not None:
+                return profile.runcall(fn, *args)
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started_at
+
+            os.makedirs(self.directory, exist_ok=True)
+            if profile is not None:
+                profile.dump_stats(path + ".prof")
+            if track_memory:
+                self._dump_allocations(path + ".allocs.txt", before, elapsed)
+                tracemalloc.stop()
+
+            logging.info(f"Profiled {name} cycle in {elapsed:.2f}s, see {path}.*")
+
+    def _dump_allocations(
+        self, path: str, before: tracemalloc.Snapshot, elapsed: float
+    ) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        # * leave out the profilers' own bookkeeping
+        ignored = [
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ]
+        after = tracemalloc.take_snapshot().filter_traces(ignored)
+        before = before.filter_traces(ignored)
+        stats = after.compare_to(before, "lineno")[: self.top_allocations]
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"cycle took {elapsed:.3f}s\n")
+            f.write(f"traced memory: {current / 1024:.1f} KiB, ")
+            f.write(f"peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"top {len(stats)} allocations by growth over the cycle:\n")
+            for stat in stats:
+                f.write(f"{stat}\n")
+
+
+# * configured from the environment, `python -m src.main --profile N`
+# * overrides the number of cycles
+profiler = CycleProfiler(
+    PROFILE_CYCLES,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_MODE,
+    PROFILE_DIR,
+    PROFILE_TOP_ALLOCATIONS,
+)
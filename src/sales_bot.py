@@ -1,40 +1,38 @@
-from typing import Union, List
+from __future__ import annotations
+from typing import Union, List, TYPE_CHECKING
 from enum import Enum, unique
+import os
 
-import discord
-
-from src.collections.kongs import build_kong_discord_message, build_kong_twitter_message
-from src.collections.sneakers import (
-    build_sneaker_discord_message,
-    build_sneaker_twitter_message,
-)
-from src.collections.rookies import (
-    build_rookie_discord_message,
-    build_rookie_twitter_message,
-)
+from src.collections.registry import COLLECTION_RENDERERS, COLLECTION_SPECS
 from src.opensea import SalesDatum
 
-import src.consts
+# * discord.py is only imported once something is rendered, see
+# * `CollectionRenderer.build_discord_messages`
+if TYPE_CHECKING:
+    import discord
 
 
-@unique
-class SalesBotType(Enum):
-    KONG = 0
-    SNEAKER = 1
-    ROOKIE = 2
-
+class SalesBotTypeBase(Enum):
     @classmethod
     def from_int(cls, v: int) -> "SalesBotType":
-        if v == 0:
-            return cls.KONG
-        elif v == 1:
-            return cls.SNEAKER
-        elif v == 2:
-            return cls.ROOKIE
-        else:
+        try:
+            return cls(v)
+        except ValueError:
             raise ValueError(f"Cannot instantiate from {v}")
 
 
+# * one member per collection, named after its spec and valued by its key
+# * in `COLLECTION_SPECS`, so that the registry entry is all there is to
+# * adding a collection. KONG = 0, SNEAKER = 1, ROOKIE = 2
+SalesBotType = unique(
+    SalesBotTypeBase(
+        "SalesBotType",
+        [(spec.name, value) for value, spec in COLLECTION_SPECS.items()],
+        module=__name__,
+    )
+)
+
+
 class SalesBot:
     def __init__(self, sales_bot_type: Union[SalesBotType, int]):
         if isinstance(sales_bot_type, int):
@@ -44,40 +42,22 @@ class SalesBot:
         else:
             self.sales_bot_type = sales_bot_type
 
-        if self.sales_bot_type == SalesBotType.KONG:
-            self.discord_webhook = src.consts.DISCORD_KONG_WEBHOOK
-            self.asset_contract_address = src.consts.KONG_CONTRACT_ADDRESS
-            self.opensea_slug = "rumble-kong-league"
-        elif self.sales_bot_type == SalesBotType.SNEAKER:
-            self.discord_webhook = src.consts.DISCORD_SNEAKER_WEBHOOK
-            self.asset_contract_address = src.consts.SNEAKER_CONTRACT_ADDRESS
-            self.opensea_slug = "rumble-kong-league-sneakers"
-        elif self.sales_bot_type == SalesBotType.ROOKIE:
-            self.discord_webhook = src.consts.DISCORD_ROOKIE_WEBHOOK
-            self.asset_contract_address = src.consts.ROOKIE_CONTRACT_ADDRESS
-            self.opensea_slug = "rkl-rookies"
-        else:
+        spec = COLLECTION_SPECS.get(getattr(self.sales_bot_type, "value", None))
+        if spec is None:
             raise ValueError("Invalid sales_bot_type.")
 
+        self.spec = spec
+        self.renderer = COLLECTION_RENDERERS[self.sales_bot_type.value]
+        self.discord_webhook = os.getenv(spec.discord_webhook_env)
+        self.asset_contract_address = spec.contract_address
+        self.opensea_slug = spec.opensea_slug
+        self.poll_interval_bounds = spec.poll_interval_bounds
+
     def build_discord_messages(self, data: List[SalesDatum]) -> List[discord.Embed]:
-        if self.sales_bot_type == SalesBotType.KONG:
-            return build_kong_discord_message(data)
-        elif self.sales_bot_type == SalesBotType.SNEAKER:
-            return build_sneaker_discord_message(data)
-        elif self.sales_bot_type == SalesBotType.ROOKIE:
-            return build_rookie_discord_message(data)
-        else:
-            raise ValueError("Invalid sales_bot_type")
+        return self.renderer.build_discord_messages(data)
 
     def build_twitter_message(self, data: List[SalesDatum]) -> str:
-        if self.sales_bot_type == SalesBotType.KONG:
-            return build_kong_twitter_message(data)
-        elif self.sales_bot_type == SalesBotType.SNEAKER:
-            return build_sneaker_twitter_message(data)
-        elif self.sales_bot_type == SalesBotType.ROOKIE:
-            return build_rookie_twitter_message(data)
-        else:
-            raise ValueError("Invalid sales_bot_type")
+        return self.renderer.build_twitter_message(data)
 
 
 def is_fresh_sale(datum: SalesDatum, since_block: int, since_index: int) -> bool:
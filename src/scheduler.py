@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import List, Optional
+from urllib.parse import urlsplit
+import statistics
+import logging
+
+from src.consts import OPENSEA_EVENTS_URL
+from src.http_client import http_client
+
+OPENSEA_HOST = urlsplit(OPENSEA_EVENTS_URL).netloc
+
+
+class AdaptiveScheduler:
+    """
+    Picks how long a collection sleeps between cycles. The interval shrinks
+    while sales are flowing, grows while the collection is idle and grows
+    faster when OpenSea throttles us, always within [min, max].
+    """
+
+    def __init__(
+        self,
+        name: str,
+        min_interval: float,
+        max_interval: float,
+        speedup: float = 0.5,
+        slowdown: float = 1.5,
+        throttle_slowdown: float = 2.0,
+    ):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.speedup = speedup
+        self.slowdown = slowdown
+        self.throttle_slowdown = throttle_slowdown
+
+        # * start fast, so that a restart catches up quickly
+        self.interval = min_interval
+        self._latencies: List[float] = []
+        self._throttled_count = http_client.rate_limit(OPENSEA_HOST).throttled_count
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def record_latencies(self, latencies: List[float]) -> None:
+        # * reported by delivery, which runs on its own schedule
+        self._latencies.extend(latencies)
+
+    def next_interval(self, sales_count: int) -> float:
+        rate_limit = http_client.rate_limit(OPENSEA_HOST)
+        is_throttled = rate_limit.throttled_count > self._throttled_count
+        is_exhausted = rate_limit.remaining == 0
+        self._throttled_count = rate_limit.throttled_count
+
+        if is_throttled or is_exhausted:
+            interval = self.interval * self.throttle_slowdown
+            wait: Optional[float] = (
+                rate_limit.retry_after if is_throttled else rate_limit.reset_after
+            )
+            if wait is not None:
+                interval = max(interval, wait)
+        elif sales_count > 0:
+            interval = self.interval * self.speedup
+        else:
+            interval = self.interval * self.slowdown
+
+        self.interval = self._clamp(interval)
+
+        latencies, self._latencies = self._latencies, []
+        latency_text = "n/a"
+        if len(latencies) > 0:
+            latency_text = (
+                f"median {statistics.median(latencies):.0f}s, max {max(latencies):.0f}s"
+            )
+        logging.info(
+            f"{self.name}: {sales_count} sales, sale to post latency {latency_text}"
+            + f"{', throttled' if is_throttled or is_exhausted else ''}"
+            + f", next poll in {self.interval:.0f}s"
+        )
+
+        return self.interval
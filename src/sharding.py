@@ -0,0 +1,302 @@
+from __future__ import annotations
+from typing import Awaitable, Callable, Dict, List, Optional, Set, TYPE_CHECKING
+from abc import ABC, abstractmethod
+import importlib
+import threading
+import asyncio
+import logging
+import sqlite3
+import socket
+import math
+import time
+import os
+
+from src.consts import (
+    LEASE_PATH,
+    LEASE_BACKEND,
+    LEASE_TTL,
+    LEASE_RENEW_INTERVAL,
+    WORKER_ID,
+)
+from src.metrics import Gauge
+from src.util import handle_exception
+
+if TYPE_CHECKING:
+    from src.sales_bot import SalesBotType
+
+LEASE_OWNED = Gauge(
+    "salesbot_lease_owned",
+    "1 while this worker holds the lease of the collection, and runs it.",
+    ["collection"],
+)
+WORKERS_ALIVE = Gauge(
+    "salesbot_workers",
+    "Workers sharing the collections, as last seen by this one.",
+)
+
+WORKER_PREFIX = "worker:"
+COLLECTION_PREFIX = "collection:"
+
+
+def is_owned(owned: Optional[Set[str]], sales_bot_type: SalesBotType) -> bool:
+    # * `owned` is a worker's `owned_collections`, None outside of worker
+    # * mode, where every collection is run. Checked before each post, so
+    # * that the sales still queued by a collection that was stopped are
+    # * left to its next owner
+    return owned is None or sales_bot_type.name in owned
+
+
+class LeaseStore(ABC):
+    """
+    Exclusive, time limited ownership of named resources, shared by the
+    workers. A lease is held by one owner until it expires, unless the
+    owner renews it first. A backend implements the methods below, each
+    of them atomic across every worker using the store.
+    """
+
+    @abstractmethod
+    def acquire(self, resource: str, owner: str, ttl: float) -> bool:
+        """
+        Takes the lease for `ttl` seconds if it is free or expired, or
+        renews it if `owner` holds it. Returns whether `owner` holds it.
+        """
+
+    @abstractmethod
+    def release(self, resource: str, owner: str) -> None:
+        # * a no-op unless `owner` holds the lease
+        ...
+
+    @abstractmethod
+    def holders(self, prefix: str) -> Dict[str, str]:
+        """
+        The owner of every unexpired lease of a resource starting with
+        `prefix`.
+        """
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """
+    Leases in SQLite, for workers on one host. Each statement is atomic
+    across processes thanks to SQLite's file locks, and the expiry is on
+    the wall clock, which the workers share.
+    """
+
+    def __init__(self, path: str = LEASE_PATH):
+        self._lock = threading.Lock()
+        # * waits on another worker's write rather than failing
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, timeout=LEASE_RENEW_INTERVAL
+        )
+
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS leases (
+                    resource TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+                """
+            )
+
+    def acquire(self, resource: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock, self._conn:
+            return (
+                self._conn.execute(
+                    """
+                    INSERT INTO leases (resource, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT (resource) DO UPDATE SET
+                        owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE leases.owner = excluded.owner OR leases.expires_at <= ?
+                    """,
+                    (resource, owner, now + ttl, now),
+                ).rowcount
+                > 0
+            )
+
+    def release(self, resource: str, owner: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM leases WHERE resource = ? AND owner = ?",
+                (resource, owner),
+            )
+
+    def holders(self, prefix: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT resource, owner FROM leases
+                WHERE substr(resource, 1, ?) = ? AND expires_at > ?
+                """,
+                (len(prefix), prefix, time.time()),
+            ).fetchall()
+        return dict(rows)
+
+
+_lease_store: Optional[LeaseStore] = None
+_lease_store_lock = threading.Lock()
+
+
+def get_lease_store() -> LeaseStore:
+    global _lease_store
+
+    with _lease_store_lock:
+        if _lease_store is None:
+            if LEASE_BACKEND:
+                module, _, name = LEASE_BACKEND.partition(":")
+                _lease_store = getattr(importlib.import_module(module), name)()
+            else:
+                _lease_store = SQLiteLeaseStore()
+        return _lease_store
+
+
+class ShardWorker:
+    """
+    Runs a share of the collections, alongside identical workers using
+    the same lease store. A worker owns a collection while it holds the
+    collection's lease, and only then runs it.
+
+    Every `renew_interval` a worker renews its own lease, which tells
+    the others it is alive, and the leases of its collections. Its share
+    is the collections divided by the live workers, rounded up. Under
+    its share it takes free or expired leases, over it (e.g. after a
+    worker joined) it stops collections. So a worker that dies loses its
+    collections to the others within `ttl`, and a new one gets some.
+
+    A collection changes hands only after its lease expires: a worker
+    that could not renew a lease stops the collection before then, and
+    one that gives a collection up lets the lease run out rather than
+    release it, so that the sales it is still sending are done before
+    another worker claims them from the outbox.
+    """
+
+    def __init__(
+        self,
+        sales_bot_types: List[SalesBotType],
+        start: Callable[[SalesBotType, Set[str]], Awaitable[None]],
+        on_acquired: Callable[[SalesBotType], None],
+        store: Optional[LeaseStore] = None,
+        worker_id: Optional[str] = WORKER_ID,
+        ttl: float = LEASE_TTL,
+        renew_interval: float = LEASE_RENEW_INTERVAL,
+    ):
+        self.sales_bot_types = sales_bot_types
+        self.start = start
+        self.on_acquired = on_acquired
+        self.store = store or get_lease_store()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+
+        # * names of the collections running, handed to `start` for
+        # * `is_owned`. Kept up to date as collections start and stop
+        self.owned_collections: Set[str] = set()
+
+        self._tasks: Dict[SalesBotType, asyncio.Future] = {}
+        # * when each owned lease was last renewed, on the monotonic clock
+        self._renewed_at: Dict[SalesBotType, float] = {}
+        # * given up collections, not taken back until their lease expired
+        self._given_up_until: Dict[SalesBotType, float] = {}
+
+    @property
+    def owned(self) -> List[SalesBotType]:
+        return list(self._tasks)
+
+    def _resource(self, sales_bot_type: SalesBotType) -> str:
+        return f"{COLLECTION_PREFIX}{sales_bot_type.name}"
+
+    async def _acquire(self, resource: str) -> bool:
+        return await asyncio.to_thread(
+            self.store.acquire, resource, self.worker_id, self.ttl
+        )
+
+    def _start(self, sales_bot_type: SalesBotType) -> None:
+        logging.info(f"{self.worker_id}: running {sales_bot_type.name}")
+        self.owned_collections.add(sales_bot_type.name)
+        self._tasks[sales_bot_type] = asyncio.ensure_future(
+            self.start(sales_bot_type, self.owned_collections)
+        )
+        LEASE_OWNED.set(1, collection=sales_bot_type.name)
+
+    async def _stop(self, sales_bot_type: SalesBotType) -> None:
+        logging.info(f"{self.worker_id}: stopping {sales_bot_type.name}")
+        self.owned_collections.discard(sales_bot_type.name)
+        task = self._tasks.pop(sales_bot_type)
+        self._renewed_at.pop(sales_bot_type, None)
+        task.cancel()
+        # * rather than awaiting the task, which would raise its cancellation
+        await asyncio.wait([task])
+        LEASE_OWNED.set(0, collection=sales_bot_type.name)
+
+    async def _rebalance(self) -> None:
+        now = time.monotonic()
+
+        await self._acquire(f"{WORKER_PREFIX}{self.worker_id}")
+        workers = await asyncio.to_thread(self.store.holders, WORKER_PREFIX)
+        WORKERS_ALIVE.set(len(workers))
+        share = math.ceil(len(self.sales_bot_types) / max(1, len(workers)))
+
+        for sales_bot_type in self.owned:
+            if await self._acquire(self._resource(sales_bot_type)):
+                self._renewed_at[sales_bot_type] = now
+            else:
+                logging.warning(
+                    f"{self.worker_id}: lost the lease of {sales_bot_type.name}"
+                )
+                await self._stop(sales_bot_type)
+
+        while len(self._tasks) > share:
+            sales_bot_type = self.owned[-1]
+            await self._stop(sales_bot_type)
+            self._given_up_until[sales_bot_type] = now + self.ttl
+
+        for sales_bot_type in self.sales_bot_types:
+            if len(self._tasks) >= share:
+                break
+            if sales_bot_type in self._tasks:
+                continue
+            if self._given_up_until.get(sales_bot_type, 0.0) > now:
+                continue
+
+            if await self._acquire(self._resource(sales_bot_type)):
+                self._renewed_at[sales_bot_type] = now
+                await asyncio.to_thread(self.on_acquired, sales_bot_type)
+                self._start(sales_bot_type)
+
+    async def _stop_expiring(self) -> None:
+        # * a lease that was not renewed in time may expire before the
+        # * next attempt, and another worker take it over
+        deadline = time.monotonic() - (self.ttl - self.renew_interval)
+        for sales_bot_type in self.owned:
+            if self._renewed_at.get(sales_bot_type, 0.0) <= deadline:
+                logging.warning(
+                    f"{self.worker_id}: could not renew the lease of "
+                    + f"{sales_bot_type.name} in time"
+                )
+                await self._stop(sales_bot_type)
+
+    async def run(self) -> None:
+        logging.info(
+            f"{self.worker_id}: sharing {len(self.sales_bot_types)} collections"
+        )
+        try:
+            while True:
+                try:
+                    await self._rebalance()
+                except Exception:
+                    # * e.g. the store is unreachable, the collections keep
+                    # * running as long as their leases are certain to hold
+                    handle_exception()
+                await self._stop_expiring()
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            for sales_bot_type in self.owned:
+                await self._stop(sales_bot_type)
+            # * the others take over the collections once their leases
+            # * expire, a restart with the same WORKER_ID right away
+            try:
+                self.store.release(f"{WORKER_PREFIX}{self.worker_id}", self.worker_id)
+            except Exception:
+                handle_exception()
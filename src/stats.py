@@ -0,0 +1,366 @@
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Set, Tuple, TypedDict
+from dataclasses import dataclass, field
+import threading
+import sqlite3
+
+from src.consts import (
+    OUTBOX_PATH,
+    STATS_DAY_WINDOW,
+    STATS_WEEK_WINDOW,
+    STATS_SYMBOLS,
+)
+from src.opensea import (
+    LAST_SALES_KEY,
+    STATS_KEY,
+    get_event_price,
+    get_event_timestamp,
+    get_event_token_ids,
+)
+
+
+class SaleStats(TypedDict):
+    volume_24h: float
+    sales_24h: int
+    floor_24h: float
+    average_7d: float
+
+
+class LastSale(TypedDict):
+    price: float
+    payment_symbol: str
+    timestamp: int
+
+
+class RollingWindow:
+    """
+    Count, volume and floor (lowest price) of the sales of the last
+    `length` seconds, kept in buckets of `bucket` seconds. The window
+    ends at the newest sale added, and moves a bucket at a time.
+
+    Adding a sale is O(1) amortised: each bucket is added to and
+    expired once. The floor is cached, and only recomputed from the
+    buckets when the bucket holding it expires.
+
+    >>> window = RollingWindow(length=10, bucket=1)
+    >>> for timestamp, price in ((0, 3.0), (5, 1.0), (12, 2.0)):
+    ...     _ = window.add(timestamp, price)
+    >>> window.count, window.volume, window.floor
+    (2, 3.0, 1.0)
+    >>> _ = window.add(16, 4.0)
+    >>> window.count, window.volume, window.floor
+    (2, 6.0, 2.0)
+    """
+
+    def __init__(self, length: int, bucket: int):
+        self.bucket = bucket
+        self.size = length // bucket
+
+        # * bucket index -> [count, volume, floor]
+        self.buckets: Dict[int, List] = {}
+        self.head: Optional[int] = None
+        self.count = 0
+        self.volume = 0.0
+        self._floor: Optional[float] = None
+        self._is_floor_stale = False
+
+    @property
+    def start(self) -> int:
+        # * index of the oldest bucket in the window
+        return 0 if self.head is None else self.head - self.size + 1
+
+    def _expire(self, index: int) -> None:
+        count, volume, floor = self.buckets.pop(index)
+        self.count -= count
+        self.volume -= volume
+        if floor == self._floor:
+            self._is_floor_stale = True
+
+    def advance(self, timestamp: int) -> None:
+        head = timestamp // self.bucket
+        if self.head is not None and head <= self.head:
+            return
+
+        start = self.start
+        self.head = head
+        if self.start - start >= self.size:
+            for index in list(self.buckets):
+                self._expire(index)
+        else:
+            for index in range(start, self.start):
+                if index in self.buckets:
+                    self._expire(index)
+
+    def add(self, timestamp: int, price: float) -> Optional[int]:
+        """
+        Returns the index of the bucket the sale went in, None if it is
+        older than the window.
+        """
+
+        self.advance(timestamp)
+        index = timestamp // self.bucket
+        if index < self.start:
+            return None
+
+        bucket = self.buckets.setdefault(index, [0, 0.0, price])
+        bucket[0] += 1
+        bucket[1] += price
+        bucket[2] = min(bucket[2], price)
+
+        self.count += 1
+        self.volume += price
+        if not self._is_floor_stale and (self._floor is None or price < self._floor):
+            self._floor = price
+        return index
+
+    def load(self, index: int, count: int, volume: float, floor: float) -> None:
+        self.buckets[index] = [count, volume, floor]
+        self.count += count
+        self.volume += volume
+        self.head = index if self.head is None else max(self.head, index)
+        self._is_floor_stale = True
+
+    @property
+    def floor(self) -> Optional[float]:
+        if self._is_floor_stale:
+            self._floor = min(
+                (floor for _, _, floor in self.buckets.values()), default=None
+            )
+            self._is_floor_stale = False
+        return self._floor
+
+
+@dataclass
+class CollectionStats:
+    day: RollingWindow = field(default_factory=lambda: RollingWindow(*STATS_DAY_WINDOW))
+    week: RollingWindow = field(
+        default_factory=lambda: RollingWindow(*STATS_WEEK_WINDOW)
+    )
+    # * token id -> its newest sale
+    last_sales: Dict[str, LastSale] = field(default_factory=dict)
+
+    def snapshot(self) -> Optional[SaleStats]:
+        if self.day.count == 0:
+            return None
+        return {
+            "volume_24h": self.day.volume,
+            "sales_24h": self.day.count,
+            "floor_24h": self.day.floor,
+            "average_7d": self.week.volume / self.week.count,
+        }
+
+
+@dataclass
+class StatsUpdate:
+    # * what `StatsEngine.record` changed, for `StatsEngine.persist`
+    collection: int
+    stats: CollectionStats
+    buckets: Dict[RollingWindow, Set[int]]
+    token_ids: Set[str]
+
+
+class StatsEngine:
+    """
+    Rolling market stats of each collection, the 24h volume, sale count
+    and floor, and the 7d average price, plus the last sale of every
+    token. Updated incrementally as sales are ingested, rather than
+    recomputed from history, and persisted in SQLite next to the outbox,
+    so a restart picks up where it left off.
+
+    Recording and persisting are separate steps, so that sales are only
+    persisted once they are in the outbox. Sales that did not make it
+    are forgotten with `evict`, and counted once when they are retried.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._stats: Dict[int, CollectionStats] = {}
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stats_buckets (
+                    collection INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    volume REAL NOT NULL,
+                    floor REAL NOT NULL,
+                    PRIMARY KEY (collection, length, bucket)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_last_sales (
+                    collection INTEGER NOT NULL,
+                    token_id TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    payment_symbol TEXT NOT NULL,
+                    timestamp INTEGER NOT NULL,
+                    PRIMARY KEY (collection, token_id)
+                )
+                """
+            )
+
+    def _windows(self, stats: CollectionStats) -> Tuple[RollingWindow, ...]:
+        return stats.day, stats.week
+
+    def _collection_stats(self, collection: int) -> CollectionStats:
+        if collection not in self._stats:
+            stats = CollectionStats()
+            for window in self._windows(stats):
+                rows = self._conn.execute(
+                    """
+                    SELECT bucket, count, volume, floor FROM stats_buckets
+                    WHERE collection = ? AND length = ?
+                    """,
+                    (collection, window.bucket * window.size),
+                ).fetchall()
+                for row in rows:
+                    window.load(*row)
+
+            rows = self._conn.execute(
+                """
+                SELECT token_id, price, payment_symbol, timestamp
+                FROM token_last_sales WHERE collection = ?
+                """,
+                (collection,),
+            ).fetchall()
+            stats.last_sales = {
+                token_id: {
+                    "price": price,
+                    "payment_symbol": payment_symbol,
+                    "timestamp": timestamp,
+                }
+                for token_id, price, payment_symbol, timestamp in rows
+            }
+            self._stats[collection] = stats
+        return self._stats[collection]
+
+    def evict(self, collection: int) -> None:
+        # * the stats are read from SQLite again on next use
+        with self._lock:
+            self._stats.pop(collection, None)
+
+    def record(self, collection: int, events: Iterable[Dict]) -> StatsUpdate:
+        """
+        Adds sales, oldest first, to the collection's stats in memory.
+        Each event is annotated, in place, with the stats as of that sale
+        (under `STATS_KEY`) and the previous sale of each of its tokens
+        (under `LAST_SALES_KEY`), so that every channel renders the same
+        values however late it posts the sale. Returns the changes, for
+        `persist`.
+        """
+
+        with self._lock:
+            stats = self._collection_stats(collection)
+            touched: Dict[RollingWindow, Set[int]] = {
+                window: set() for window in self._windows(stats)
+            }
+            touched_tokens: Set[str] = set()
+
+            for event in events:
+                price, payment_symbol = get_event_price(event)
+                timestamp = get_event_timestamp(event)
+                token_ids = get_event_token_ids(event)
+
+                event[LAST_SALES_KEY] = {
+                    token_id: stats.last_sales[token_id]
+                    for token_id in token_ids
+                    if token_id in stats.last_sales
+                }
+
+                if timestamp is not None:
+                    if payment_symbol in STATS_SYMBOLS:
+                        for window, indexes in touched.items():
+                            index = window.add(timestamp, price)
+                            if index is not None:
+                                indexes.add(index)
+
+                    # * the assets of a bundle each get an even share
+                    share = price / len(token_ids)
+                    for token_id in token_ids:
+                        last_sale = stats.last_sales.get(token_id)
+                        if last_sale is None or last_sale["timestamp"] <= timestamp:
+                            stats.last_sales[token_id] = {
+                                "price": share,
+                                "payment_symbol": payment_symbol,
+                                "timestamp": timestamp,
+                            }
+                            touched_tokens.add(token_id)
+
+                event[STATS_KEY] = stats.snapshot()
+
+            return StatsUpdate(collection, stats, touched, touched_tokens)
+
+    def persist(self, update: StatsUpdate) -> None:
+        with self._lock:
+            # * evicted since, what is in memory now was read from SQLite
+            if self._stats.get(update.collection) is not update.stats:
+                return
+            self._persist(
+                update.collection, update.stats, update.buckets, update.token_ids
+            )
+
+    def _persist(
+        self,
+        collection: int,
+        stats: CollectionStats,
+        touched: Dict[RollingWindow, Set[int]],
+        touched_tokens: Set[str],
+    ) -> None:
+        with self._conn:
+            for window, indexes in touched.items():
+                length = window.bucket * window.size
+                self._conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO stats_buckets
+                    (collection, length, bucket, count, volume, floor)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    [
+                        (collection, length, index, *window.buckets[index])
+                        for index in indexes
+                        if index in window.buckets
+                    ],
+                )
+                self._conn.execute(
+                    """
+                    DELETE FROM stats_buckets
+                    WHERE collection = ? AND length = ? AND bucket < ?
+                    """,
+                    (collection, length, window.start),
+                )
+
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO token_last_sales
+                (collection, token_id, price, payment_symbol, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        collection,
+                        token_id,
+                        stats.last_sales[token_id]["price"],
+                        stats.last_sales[token_id]["payment_symbol"],
+                        stats.last_sales[token_id]["timestamp"],
+                    )
+                    for token_id in touched_tokens
+                ],
+            )
+
+
+_stats_engine: Optional[StatsEngine] = None
+_stats_engine_lock = threading.Lock()
+
+
+def get_stats_engine() -> StatsEngine:
+    global _stats_engine
+
+    with _stats_engine_lock:
+        if _stats_engine is None:
+            _stats_engine = StatsEngine()
+        return _stats_engine
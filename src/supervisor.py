@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import Awaitable, Callable
+import asyncio
+import logging
+import random
+import time
+
+from src.consts import (
+    SUPERVISOR_BACKOFF_BASE,
+    SUPERVISOR_BACKOFF_MAX,
+    SUPERVISOR_FAILURE_THRESHOLD,
+    SUPERVISOR_COOLDOWN,
+    SUPERVISOR_HEALTHY_RUN,
+)
+from src.metrics import Gauge
+from src.util import handle_exception
+
+CIRCUIT_OPEN = Gauge(
+    "salesbot_circuit_open",
+    "1 while a loop's circuit breaker is open, after repeated failures.",
+    ["loop"],
+)
+
+
+class CircuitBreaker:
+    """
+    Decides how long a failing loop waits before its next attempt. The
+    wait grows exponentially, with jitter, from `backoff_base` up to
+    `backoff_max`. After `failure_threshold` failures in a row the
+    circuit opens: the next attempt waits the `cooldown`, so that a dead
+    dependency is not hammered. That attempt is a probe (half open), one
+    success closes the circuit, a failure opens it for another cooldown.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        backoff_base: float = SUPERVISOR_BACKOFF_BASE,
+        backoff_max: float = SUPERVISOR_BACKOFF_MAX,
+        failure_threshold: int = SUPERVISOR_FAILURE_THRESHOLD,
+        cooldown: float = SUPERVISOR_COOLDOWN,
+    ):
+        self.name = name
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+
+        # * in a row, a success resets them
+        self.failures = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.failure_threshold
+
+    def record_success(self) -> None:
+        if self.is_open:
+            logging.info(f"{self.name}: recovered, closing the circuit")
+        self.failures = 0
+        CIRCUIT_OPEN.set(0, loop=self.name)
+
+    def record_failure(self) -> float:
+        """
+        Returns how long to wait before the next attempt, in seconds.
+        """
+
+        self.failures += 1
+
+        if self.is_open:
+            CIRCUIT_OPEN.set(1, loop=self.name)
+            return self.cooldown
+
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        # * jittered, so that loops failing together don't retry together
+        return random.uniform(cap / 2, cap)
+
+
+async def sleep_on_error(breaker: CircuitBreaker) -> None:
+    handle_exception()
+    delay = breaker.record_failure()
+    logging.warning(
+        f"{breaker.name}: error occured ({breaker.failures} in a row)"
+        + f"{', circuit open' if breaker.is_open else ''}"
+        + f"... Retrying in {delay:.0f}s..."
+    )
+    await asyncio.sleep(delay)
+    if breaker.is_open:
+        logging.info(f"{breaker.name}: circuit half open, probing")
+
+
+async def supervise(
+    name: str,
+    start: Callable[[], Awaitable[None]],
+    healthy_run: float = SUPERVISOR_HEALTHY_RUN,
+) -> None:
+    """
+    Runs `start()` and restarts it whenever it raises, within this
+    process, rather than letting the error take down every collection.
+    A run that was healthy for `healthy_run` seconds counts as a success,
+    so that failures hours apart do not add up to an open circuit.
+    """
+
+    breaker = CircuitBreaker(name)
+    while True:
+        started_at = time.monotonic()
+        try:
+            await start()
+            breaker.record_success()
+            return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            if time.monotonic() - started_at >= healthy_run:
+                breaker.record_success()
+            await sleep_on_error(breaker)
@@ -1,5 +1,9 @@
 import logging
-import requests
+
+from src.consts import OPENSEA_NFT_URL
+from src.http_client import http_client
+from src.metrics import time_stage
+from src.price_oracle import price_oracle
 
 
 # ! implement email sending on error
@@ -10,23 +14,20 @@ def handle_exception() -> None:
 
 
 def get_usd_price(symbol):
-    url = "https://api.coinbase.com/v2/exchange-rates?currency=USD"
-    resp = requests.get(url)
-    if symbol == "WETH":
-        symbol = "ETH"
-    price = float(resp.json()["data"]["rates"][symbol])
-    return 1 / price
+    return price_oracle.get_usd_price(symbol)
 
 
 def fetch_token_image_url(tokenId, contractAddress):
-    url = f"https://api.opensea.io/api/v2/chain/ethereum/contract/{contractAddress}/nfts/{tokenId}"
+    url = f"{OPENSEA_NFT_URL}{contractAddress}/nfts/{tokenId}"
 
     headers = {
         "accept": "application/json",
         "x-api-key": "9f5425ef0d3743d1988884e599d2ab6a",
     }
 
-    resp = requests.get(url, headers=headers)
+    with time_stage("image_fetch"):
+        resp = http_client.get(url, headers=headers)
+    resp.raise_for_status()
 
     resp_json = resp.json()
     return resp_json["nft"]["image_url"]